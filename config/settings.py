@@ -16,6 +16,22 @@ class Settings:
     max_results_per_creator: int = int(os.getenv("MAX_RESULTS_PER_CREATOR", "25"))
     user_agent: str = os.getenv("USER_AGENT", "viral-engine/1.0")
 
+    # Discovery concurrency (1 worker = old serial behaviour)
+    discovery_workers: int = int(os.getenv("DISCOVERY_WORKERS", "16"))
+    youtube_concurrency: int = int(os.getenv("YOUTUBE_CONCURRENCY", "8"))
+    twitch_concurrency: int = int(os.getenv("TWITCH_CONCURRENCY", "8"))
+
+    # "playlist" reads uploads playlists (1 unit) instead of search.list (100)
+    youtube_discovery_mode: str = os.getenv("YOUTUBE_DISCOVERY_MODE", "playlist")
+
+    # Discovery responses younger than this are served from data/cache
+    http_cache_ttl_minutes: float = float(os.getenv("HTTP_CACHE_TTL_MINUTES", "30"))
+
+    # Twitch login -> user id mapping barely ever changes
+    twitch_user_cache_ttl_hours: float = float(
+        os.getenv("TWITCH_USER_CACHE_TTL_HOURS", "168")
+    )
+
 
 def get_settings() -> Settings:
     s = Settings()
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .synthetic import BENCH_DIR, SourceSpec, generate
+
+BASELINE_PATH = Path("config/bench_baseline.json")
+REPORT_PATH = Path("bench_output.txt")
+
+CLIP_S = 45  # clip-level benches (crop / overlays / render) run on a 45s clip
+
+# Source-level benches scan a whole source; clip-level ones take a clip
+SOURCE_BENCHES = (
+    "get_scene_changes",
+    "get_scene_changes_parallel",
+    "get_scene_changes_full",
+    "get_audio_spikes",
+    "find_best_moment",
+)
+CLIP_BENCHES = (
+    "crop_to_shorts",
+    "crop_to_shorts_face",
+    "add_overlays",
+    "render_shorts",
+)
+BENCHES = SOURCE_BENCHES + CLIP_BENCHES
+
+
+@dataclass
+class BenchResult:
+    case: str
+    bench: str
+    source: str
+    media_s: float
+    wall_s: float
+    cpu_s: float
+    peak_rss_mb: float
+    detail: str = ""
+
+    @property
+    def realtime_factor(self) -> float:
+        # Seconds of media processed per second of wall time
+        return self.media_s / self.wall_s if self.wall_s > 0 else 0.0
+
+
+# ----------------------------
+# CASES (run in a fresh process each, so peak RSS is per case)
+# ----------------------------
+def _cut_detail(scenes: List[Any], spec: SourceSpec, tolerance_s: float) -> str:
+    # A cut counts if it's within tolerance of where the source really cuts
+    found = [end for _, end in scenes] if len(scenes) > 1 else []
+    expected = spec.cut_times()
+    hit = sum(1 for t in expected if any(abs(f - t) <= tolerance_s for f in found))
+    return f"cuts {hit}/{len(expected)} (found {len(found)})"
+
+
+def _scene_changes(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.video.scene_change_detector import FAST_STEP, get_scene_changes
+
+    scenes = get_scene_changes(src)
+    return _cut_detail(scenes, spec, (FAST_STEP + 1) / spec.fps)
+
+
+def _scene_changes_parallel(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.video.scene_change_detector import FAST_STEP, get_scene_changes
+
+    # Fast scan split over every core; should find exactly the serial cuts
+    scenes = get_scene_changes(src, workers=os.cpu_count() or 1)
+    return _cut_detail(scenes, spec, (FAST_STEP + 1) / spec.fps)
+
+
+def _scene_changes_full(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.video.scene_change_detector import get_scene_changes
+
+    # The full-resolution per-frame scan, for comparison with the fast one
+    scenes = get_scene_changes(src, mode="full")
+    return _cut_detail(scenes, spec, 2 / spec.fps)
+
+
+def _audio_spikes(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.video.audio_spike_detector import get_audio_spikes
+
+    times = get_audio_spikes(src)
+    bursts = spec.burst_times()
+    hit = sum(1 for b in bursts if ((times >= b) & (times < b + 1.5)).any())
+    return f"bursts {hit}/{len(bursts)}"
+
+
+def _best_moment(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.video.moment_detector import find_best_moment
+
+    start, end = find_best_moment(src)
+    return f"moment {float(start):.1f}-{float(end):.1f}s"
+
+
+def _per_frame(t0: float, spec: SourceSpec) -> str:
+    ms = (time.perf_counter() - t0) * 1000 / (spec.seconds * spec.fps)
+    return f"{ms:.2f} ms/frame"
+
+
+def _crop(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.editing.shorts_cropper import crop_to_shorts
+
+    t0 = time.perf_counter()
+    crop_to_shorts(src, work / "shorts.mp4", mode="fit")
+    return _per_frame(t0, spec)
+
+
+def _crop_face(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.editing.shorts_cropper import crop_to_shorts
+
+    # Same clip through the face-tracked crop, for cost per output frame
+    # against the static layout above
+    t0 = time.perf_counter()
+    crop_to_shorts(src, work / "shorts.mp4", mode="face")
+    return _per_frame(t0, spec)
+
+
+def _overlays(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.editing.overlays import add_overlays
+
+    add_overlays(src, work / "overlay.mp4")
+    return ""
+
+
+def _render(src: Path, work: Path, spec: SourceSpec) -> str:
+    from engine.editing.renderer import render_shorts
+
+    render_shorts(src).unlink(missing_ok=True)
+    return ""
+
+
+CASE_FNS: Dict[str, Callable[[Path, Path, SourceSpec], str]] = {
+    "get_scene_changes": _scene_changes,
+    "get_scene_changes_parallel": _scene_changes_parallel,
+    "get_scene_changes_full": _scene_changes_full,
+    "get_audio_spikes": _audio_spikes,
+    "find_best_moment": _best_moment,
+    "crop_to_shorts": _crop,
+    "crop_to_shorts_face": _crop_face,
+    "add_overlays": _overlays,
+    "render_shorts": _render,
+}
+
+
+def _run_case(bench: str, spec: SourceSpec, src: str) -> Dict[str, Any]:
+    from engine.utils.metrics import child_cpu_s, peak_rss
+
+    work = BENCH_DIR / "work" / bench
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir(parents=True, exist_ok=True)
+
+    t0, c0, k0 = time.perf_counter(), time.process_time(), child_cpu_s()
+    detail = CASE_FNS[bench](Path(src), work, spec)
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - c0 + child_cpu_s() - k0
+
+    # Lifetime peaks, but each case runs in a fresh process, so they're its own
+    own, kids = peak_rss()
+    shutil.rmtree(work, ignore_errors=True)
+    return {"wall_s": wall, "cpu_s": cpu, "peak_rss": max(own, kids), "detail": detail}
+
+
+def run_bench(bench: str, spec: SourceSpec, repeat: int = 1) -> BenchResult:
+    if bench in CLIP_BENCHES:
+        spec = SourceSpec(height=spec.height, seconds=CLIP_S, fps=spec.fps)
+    src = generate(spec)
+
+    runs: List[Dict[str, Any]] = []
+    ctx = multiprocessing.get_context("spawn")
+    for _ in range(max(1, repeat)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            runs.append(pool.submit(_run_case, bench, spec, str(src)).result())
+
+    best = min(runs, key=lambda r: r["wall_s"])
+    return BenchResult(
+        case=f"{bench}@{spec.name}",
+        bench=bench,
+        source=spec.name,
+        media_s=float(spec.seconds),
+        wall_s=best["wall_s"],
+        cpu_s=best["cpu_s"],
+        peak_rss_mb=max(r["peak_rss"] for r in runs) / 2**20,
+        detail=best["detail"],
+    )
+
+
+# ----------------------------
+# BASELINE
+# ----------------------------
+def load_baseline(path: Path = BASELINE_PATH) -> Dict[str, Dict[str, float]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baseline(
+    results: Sequence[BenchResult], path: Path = BASELINE_PATH
+) -> None:
+    data = load_baseline(path)
+    for r in results:
+        data[r.case] = {
+            "realtime_factor": round(r.realtime_factor, 3),
+            "peak_rss_mb": round(r.peak_rss_mb, 1),
+        }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def compare(
+    r: BenchResult, baseline: Dict[str, Dict[str, float]], tolerance: float
+) -> Optional[str]:
+    # None if within tolerance (or no baseline), else what regressed
+    base = baseline.get(r.case)
+    if not base:
+        return None
+    problems = []
+    if r.realtime_factor < base["realtime_factor"] * (1 - tolerance):
+        problems.append(
+            f"speed {r.realtime_factor:.2f}x < baseline {base['realtime_factor']:.2f}x"
+        )
+    if r.peak_rss_mb > base["peak_rss_mb"] * (1 + tolerance):
+        problems.append(
+            f"memory {r.peak_rss_mb:.0f}MB > baseline {base['peak_rss_mb']:.0f}MB"
+        )
+    return "; ".join(problems) or None
+
+
+def report(
+    results: Sequence[BenchResult],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    # Prints and writes the table; returns the regressions
+    lines = [
+        f"{'case':<32} {'media':>7} {'wall':>8} {'rt x':>7} {'base x':>7}"
+        f" {'rss MB':>7}  detail",
+    ]
+    failures: List[str] = []
+    for r in results:
+        base = baseline.get(r.case, {}).get("realtime_factor")
+        problem = compare(r, baseline, tolerance)
+        mark = "❌" if problem else ("✅" if base else "  ")
+        lines.append(
+            f"{r.case:<32} {r.media_s:>6.0f}s {r.wall_s:>7.1f}s"
+            f" {r.realtime_factor:>6.2f}x {(f'{base:.2f}x' if base else '-'):>7}"
+            f" {r.peak_rss_mb:>7.0f}  {r.detail} {mark}"
+        )
+        if problem:
+            failures.append(f"{r.case}: {problem}")
+
+    text = "\n".join(lines)
+    print(text)
+    REPORT_PATH.write_text(
+        text + "\n\n" + json.dumps([asdict(r) for r in results], indent=2) + "\n",
+        encoding="utf-8",
+    )
+    return failures
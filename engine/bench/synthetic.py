@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+BENCH_DIR = Path("data/bench")
+
+# Hard cuts: the picture is negated for CUT_ON_S out of every CUT_PERIOD_S, so
+# scenes alternate 90s / 60s (both long enough for a 45s moment).
+CUT_PERIOD_S = 150
+CUT_ON_S = 90
+# Loud bursts: 1s at full volume every BURST_EVERY_S over a quiet tone
+BURST_EVERY_S = 20
+BURST_LEN_S = 1
+QUIET_VOLUME = 0.05
+
+HEIGHTS = {720: (1280, 720), 1080: (1920, 1080)}
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    height: int
+    seconds: int
+    fps: int = 30
+
+    @property
+    def name(self) -> str:
+        return f"{self.height}p-{self.seconds}s"
+
+    @property
+    def path(self) -> Path:
+        return BENCH_DIR / f"synthetic_{self.name}_{self.fps}fps.mp4"
+
+    def cut_times(self) -> List[float]:
+        # Where get_scene_changes should find a cut
+        out: List[float] = []
+        t = 0.0
+        while True:
+            for step in (CUT_ON_S, CUT_PERIOD_S - CUT_ON_S):
+                t += step
+                if t >= self.seconds:
+                    return out
+                out.append(t)
+
+    def burst_times(self) -> List[float]:
+        return [float(t) for t in range(0, self.seconds, BURST_EVERY_S)]
+
+
+def generate(spec: SourceSpec, force: bool = False) -> Path:
+    # Deterministic: same spec -> same file, so it's generated once and reused
+    if spec.path.exists() and not force:
+        return spec.path
+    spec.path.parent.mkdir(parents=True, exist_ok=True)
+
+    w, h = HEIGHTS[spec.height]
+    video = (
+        f"testsrc2=size={w}x{h}:rate={spec.fps}:duration={spec.seconds},"
+        f"negate=enable='lt(mod(t,{CUT_PERIOD_S}),{CUT_ON_S})'"
+    )
+    audio = (
+        f"sine=frequency=440:sample_rate=44100:duration={spec.seconds},"
+        f"volume=volume='if(lt(mod(t,{BURST_EVERY_S}),{BURST_LEN_S}),1,"
+        f"{QUIET_VOLUME})':eval=frame"
+    )
+    tmp = spec.path.with_name(spec.path.stem + ".tmp.mp4")
+
+    print(f"🧪 Generating {spec.path} ...")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-f", "lavfi", "-i", video,
+            "-f", "lavfi", "-i", audio,
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "28",
+            "-g", str(spec.fps * 2),
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "96k",
+            "-shortest",
+            str(tmp),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    tmp.replace(spec.path)
+    return spec.path
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from pathlib import Path
-from typing import Any, Dict, Sequence, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
+from .http_cache import ResponseCache
+from .snapshots import SnapshotStore
 from .youtube_fetcher import YouTubeFetcher, YouTubeVideo
 from .twitch_fetcher import TwitchFetcher, TwitchVOD
 
@@ -11,6 +16,8 @@ from .twitch_fetcher import TwitchFetcher, TwitchVOD
 Creator = Dict[str, Any]
 DiscoveryItem = Union[YouTubeVideo, TwitchVOD]
 
+YOUTUBE_MODES = ("search", "playlist")
+
 
 def load_creators(path: str = "config/creators.json") -> Sequence[Creator]:
     p = Path(path)
@@ -26,11 +33,36 @@ class DiscoveryService:
         tw: TwitchFetcher,
         days_lookback: int = 14,
         max_results_per_creator: int = 25,
+        max_workers: int = 1,
+        platform_limits: Optional[Dict[str, int]] = None,
+        youtube_mode: str = "search",
+        snapshots: Optional[SnapshotStore] = None,
     ) -> None:
+        if youtube_mode not in YOUTUBE_MODES:
+            raise ValueError(f"Unknown youtube_mode: {youtube_mode}")
+
         self.yt = yt
         self.tw = tw
         self.days_lookback = days_lookback
         self.max_results_per_creator = max_results_per_creator
+        self.max_workers = max(1, max_workers)
+        self.youtube_mode = youtube_mode
+        self.snapshots = snapshots
+
+        # Per-platform caps so one API can't eat the whole pool
+        self._limits = {
+            platform: threading.BoundedSemaphore(max(1, n))
+            for platform, n in (platform_limits or {}).items()
+        }
+
+        # One discovery-side pass at a time: fetch_all and refresh_stats both
+        # reset the quota counter and write the snapshot store
+        self._busy = threading.Lock()
+
+        # creator id -> error message from the last fetch_all
+        self.errors: Dict[str, str] = {}
+        # YouTube Data API units spent by the last fetch_all
+        self.last_quota_used = 0
 
     def fetch_for_creator(self, c: Creator) -> Sequence[DiscoveryItem]:
         platform = str(c.get("platform") or "")
@@ -65,10 +97,277 @@ class DiscoveryService:
     def fetch_all(
         self, creators: Sequence[Creator]
     ) -> Dict[str, Sequence[DiscoveryItem]]:
+        with self._busy:
+            return self._fetch_all(creators)
+
+    def _fetch_all(
+        self, creators: Sequence[Creator]
+    ) -> Dict[str, Sequence[DiscoveryItem]]:
+        self.errors = {}
+        self.yt.reset_quota()
+        if self.snapshots is not None:
+            self.snapshots.begin_cycle()
+        for cache in self._caches():
+            cache.reset_stats()
+
+        todo = [c for c in creators if str(c.get("id") or "")]
+        self._prewarm_twitch_users(todo)
+
+        batched_yt = self.youtube_mode == "playlist"
+        playlists = self._uploads_playlists(todo) if batched_yt else {}
+
+        jobs: List[Tuple[Creator, Callable[[], Any]]] = []
+        for c in todo:
+            if batched_yt and c.get("platform") == "youtube":
+                jobs.append((c, lambda c=c: self._list_uploads(c, playlists)))
+            else:
+                jobs.append((c, lambda c=c: self.fetch_for_creator(c)))
+
+        results = self._run_jobs(jobs)
+
+        if batched_yt:
+            self._hydrate_youtube(todo, results)
+
         out: Dict[str, Sequence[DiscoveryItem]] = {}
-        for c in creators:
-            cid = str(c.get("id") or "")
-            if not cid:
+        for c in todo:
+            items = results.get(str(c["id"])) or []
+            if self.snapshots is not None and not (
+                batched_yt and c.get("platform") == "youtube"
+            ):
+                # Full fresh payloads: just snapshot them for velocity
+                items = [self.snapshots.record(it) for it in items]
+            out[str(c["id"])] = items
+
+        if self.snapshots is not None:
+            self.snapshots.prune(self.days_lookback)
+            self.snapshots.save()
+
+        self.last_quota_used = self.yt.reset_quota()
+        print(f"📊 YouTube quota this cycle: {self.last_quota_used} units")
+        for cache in self._caches():
+            cache.save()
+            st = cache.stats()
+            print(
+                f"📦 HTTP cache: {st['hits']} hits | {st['misses']} misses"
+                f" | {st['not_modified']} not modified"
+            )
+        if self.errors:
+            print(f"⚠️ Discovery failed for {len(self.errors)}/{len(todo)} creators")
+        return out
+
+    def refresh_stats(self) -> int:
+        # Counters-only pass over snapshotted items that are due, without a
+        # full discovery. Runs on its own schedule between discovery cycles.
+        with self._busy:
+            return self._refresh_stats()
+
+    def _refresh_stats(self) -> int:
+        store = self.snapshots
+        if store is None:
+            return 0
+
+        store.begin_cycle()
+        refreshed = 0
+
+        yt_ids = [k.split(":", 1)[1] for k in store.due_keys("youtube")]
+        if yt_ids:
+            self.yt.reset_quota()
+            try:
+                stats = self.yt.fetch_videos(yt_ids, part="statistics", cached=False)
+            except Exception as e:
+                print("⚠️ YouTube stats refresh failed:", e)
+                stats = {}
+            for vid, v in stats.items():
+                old = store.get(f"youtube:{vid}")
+                if isinstance(old, YouTubeVideo):
+                    store.record(self.yt.with_stats(old, v))
+                    refreshed += 1
+            print(f"📊 YouTube quota for stats refresh: {self.yt.reset_quota()} units")
+
+        tw_ids = [k.split(":", 1)[1] for k in store.due_keys("twitch")]
+        if tw_ids:
+            try:
+                counts = self.tw.fetch_view_counts(tw_ids)
+            except Exception as e:
+                print("⚠️ Twitch stats refresh failed:", e)
+                counts = {}
+            for vod_id, views in counts.items():
+                old = store.get(f"twitch:{vod_id}")
+                if isinstance(old, TwitchVOD):
+                    store.record(replace(old, view_count=views))
+                    refreshed += 1
+
+        store.prune(self.days_lookback)
+        store.save()
+        print(
+            f"🔄 Stats refresh: {refreshed}/{len(yt_ids) + len(tw_ids)} due items updated"
+        )
+        return refreshed
+
+    def _caches(self) -> List[ResponseCache]:
+        # Usually one cache shared by both fetchers; report it once
+        caches: Dict[int, ResponseCache] = {}
+        for cache in (self.yt.cache, self.tw.cache):
+            if cache is not None:
+                caches[id(cache)] = cache
+        return list(caches.values())
+
+    def _run_jobs(
+        self, jobs: Sequence[Tuple[Creator, Callable[[], Any]]]
+    ) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+
+        if self.max_workers == 1 or len(jobs) <= 1:
+            for c, fn in jobs:
+                cid = str(c["id"])
+                try:
+                    results[cid] = fn()
+                except Exception as e:
+                    self._record_error(cid, e)
+            return results
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="discovery"
+        ) as pool:
+            futures = [
+                (str(c["id"]), pool.submit(self._limited, c, fn)) for c, fn in jobs
+            ]
+            for cid, fut in futures:
+                try:
+                    results[cid] = fut.result()
+                except Exception as e:
+                    self._record_error(cid, e)
+        return results
+
+    def _limited(self, c: Creator, fn: Callable[[], Any]) -> Any:
+        limit = self._limits.get(str(c.get("platform") or ""))
+        if limit is None:
+            return fn()
+        with limit:
+            return fn()
+
+    # ----------------------------
+    # YOUTUBE PLAYLIST MODE
+    # ----------------------------
+    def _uploads_playlists(self, creators: Sequence[Creator]) -> Dict[str, str]:
+        channel_ids = [
+            str(c.get("channel_id") or "")
+            for c in creators
+            if c.get("platform") == "youtube"
+        ]
+        if not channel_ids:
+            return {}
+        try:
+            return self.yt.uploads_playlists(channel_ids)
+        except Exception as e:
+            # Every YouTube creator will report "no uploads playlist" below
+            print("⚠️ Uploads playlist lookup failed:", e)
+            return {}
+
+    def _list_uploads(self, c: Creator, playlists: Dict[str, str]) -> List[str]:
+        channel_id = str(c["channel_id"])
+        playlist_id = playlists.get(channel_id)
+        if not playlist_id:
+            raise LookupError(f"No uploads playlist for channel {channel_id}")
+        return self.yt.recent_upload_ids(
+            playlist_id,
+            days_lookback=self.days_lookback,
+            max_results=self.max_results_per_creator,
+        )
+
+    def _hydrate_youtube(
+        self, creators: Sequence[Creator], results: Dict[str, Any]
+    ) -> None:
+        # results[cid] holds upload ids for YouTube creators at this point
+        yt_creators = [
+            c
+            for c in creators
+            if c.get("platform") == "youtube" and str(c["id"]) in results
+        ]
+        all_ids = [vid for c in yt_creators for vid in results[str(c["id"])]]
+
+        store = self.snapshots
+        if store is None:
+            new_ids, due_ids = all_ids, []
+        else:
+            known = {vid for vid in all_ids if store.has(f"youtube:{vid}")}
+            new_ids = [vid for vid in all_ids if vid not in known]
+            due_ids = [vid for vid in known if store.is_due(f"youtube:{vid}")]
+
+        try:
+            vitems = self.yt.fetch_videos(new_ids)
+            # Known videos only need counters, and they must be live numbers
+            stats = (
+                self.yt.fetch_videos(due_ids, part="statistics", cached=False)
+                if due_ids
+                else {}
+            )
+        except Exception as e:
+            for c in yt_creators:
+                self._record_error(str(c["id"]), e)
+                results.pop(str(c["id"]), None)
+            return
+
+        for c in yt_creators:
+            cid = str(c["id"])
+            ids = results[cid]
+            videos = self.yt.build_videos(
+                creator_id=cid,
+                creator_label=str(c.get("label") or cid),
+                channel_id=str(c["channel_id"]),
+                video_ids=ids,
+                vitems=vitems,
+            )
+            if store is not None:
+                videos = [store.record(v) for v in videos]
+                videos.extend(self._from_snapshots(ids, vitems, stats))
+                videos.sort(key=lambda x: x.published_at, reverse=True)
+            results[cid] = videos
+
+        if store is not None:
+            reused = len(all_ids) - len(new_ids) - len(due_ids)
+            print(
+                f"🗂 Snapshots: {len(new_ids)} new | {len(due_ids)} refreshed"
+                f" | {reused} reused"
+            )
+
+    def _from_snapshots(
+        self,
+        ids: Sequence[str],
+        vitems: Dict[str, Dict[str, Any]],
+        stats: Dict[str, Dict[str, Any]],
+    ) -> List[YouTubeVideo]:
+        assert self.snapshots is not None
+        out: List[YouTubeVideo] = []
+        for vid in ids:
+            if vid in vitems:
+                continue
+            old = self.snapshots.get(f"youtube:{vid}")
+            if not isinstance(old, YouTubeVideo):
                 continue
-            out[cid] = self.fetch_for_creator(c)
+            if vid in stats:
+                old = self.snapshots.record(self.yt.with_stats(old, stats[vid]))
+            out.append(old)
         return out
+
+    # ----------------------------
+    # TWITCH
+    # ----------------------------
+    def _prewarm_twitch_users(self, creators: Sequence[Creator]) -> None:
+        # One batched /users pass (mostly cache hits) instead of one per creator
+        logins = [
+            str(c.get("twitch_login") or "")
+            for c in creators
+            if c.get("platform") == "twitch"
+        ]
+        if not logins:
+            return
+        try:
+            self.tw.resolve_user_ids(logins)
+        except Exception as e:
+            # Not fatal: fetch_recent_vods resolves per creator as a fallback
+            print("⚠️ Bulk Twitch user lookup failed:", e)
+
+    def _record_error(self, cid: str, e: Exception) -> None:
+        self.errors[cid] = f"{type(e).__name__}: {e}"
+        print(f"⚠️ Discovery failed for {cid}: {e}")
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional
+
+import requests
+
+from engine.utils.disk_cache import CACHE_DIR, JsonCache
+
+
+# Never part of a cache key (secrets / per-process values)
+_VOLATILE_PARAMS = {"key"}
+
+# Stale entries are kept this long for ETag revalidation, then dropped
+STALE_GRACE_S = 24 * 3600
+
+Fetch = Callable[[Dict[str, str]], requests.Response]
+
+
+def cache_key(url: str, params: Mapping[str, Any]) -> str:
+    clean = {k: v for k, v in params.items() if k not in _VOLATILE_PARAMS}
+    return url + "?" + json.dumps(clean, sort_keys=True, separators=(",", ":"))
+
+
+class ResponseCache:
+    # JSON response cache shared by the discovery fetchers.
+    #
+    # Fresh entries (younger than their TTL) are served without touching the
+    # network. Stale entries that carry an ETag are revalidated with
+    # If-None-Match; a 304 renews the entry. Everything is persisted so a
+    # restart within the TTL starts warm.
+
+    def __init__(
+        self,
+        path: str | Path = CACHE_DIR / "http_responses.json",
+        ttl_seconds: float = 1800,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._store = JsonCache(path)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get_json(
+        self,
+        key: str,
+        fetch: Fetch,
+        ttl_seconds: Optional[float] = None,
+        conditional: bool = False,
+    ) -> Dict[str, Any]:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+
+        fresh = self._store.get(key)
+        if fresh is not None:
+            self._count("hits")
+            return fresh
+
+        entry = self._store.get_entry(key)
+        headers: Dict[str, str] = {}
+        # Only revalidate when we actually hold the body a 304 would point at
+        if conditional and entry and entry.get("etag") and "value" in entry:
+            headers["If-None-Match"] = entry["etag"]
+
+        r = fetch(headers)
+
+        if r.status_code == 304:
+            if headers:
+                self._count("not_modified")
+                # Re-set rather than touch: the entry may have been pruned
+                # while the request was in flight
+                self._store.set(key, entry["value"], ttl, etag=entry["etag"])
+                return entry["value"]
+            # Orphan 304 with nothing cached to serve: refetch unconditionally
+            r = fetch({})
+            if r.status_code == 304:
+                raise requests.HTTPError(
+                    f"304 without a cached body for {key}", response=r
+                )
+
+        r.raise_for_status()
+        data = r.json()
+        self._count("misses")
+        self._store.set(key, data, ttl, etag=r.headers.get("ETag"))
+        return data
+
+    def reset_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = self.stats()
+            self.hits = self.misses = self.not_modified = 0
+        return stats
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+    def save(self) -> None:
+        self._store.prune(STALE_GRACE_S)
+        self._store.save()
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+from zoneinfo import ZoneInfo
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# YouTube Data API 403 reasons
+YT_RATE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+YT_QUOTA_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+
+# YouTube quota resets at midnight Pacific time
+YT_QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaExceededError(RuntimeError):
+    pass
+
+
+def _youtube_error_reason(r: requests.Response) -> str:
+    try:
+        errors = r.json().get("error", {}).get("errors") or []
+    except ValueError:
+        return ""
+    return str(errors[0].get("reason", "")) if errors else ""
+
+
+def _next_quota_reset() -> float:
+    now = datetime.now(YT_QUOTA_TZ)
+    midnight = (now + timedelta(days=1)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return midnight.timestamp()
+
+
+class _HostThrottle:
+    # Tracks what a host told us about its rate limit and holds callers back
+    # before they'd get a 429, instead of after.
+
+    def __init__(self, low_watermark: int) -> None:
+        self.low_watermark = low_watermark
+        self._lock = threading.Lock()
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+        self.quota_blocked_until = 0.0
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.time()
+                if self.quota_blocked_until > now:
+                    raise QuotaExceededError("YouTube API quota exhausted for today")
+
+                wait = self.blocked_until - now
+                if (
+                    self.remaining is not None
+                    and self.remaining <= self.low_watermark
+                    and self.reset_at > now
+                ):
+                    wait = max(wait, self.reset_at - now)
+
+                if wait <= 0:
+                    if self.remaining is not None:
+                        # Count in-flight requests so parallel workers agree
+                        self.remaining -= 1
+                    return
+            time.sleep(min(wait, 60))
+            with self._lock:
+                if self.reset_at <= time.time():
+                    self.remaining = None
+
+    def update(self, r: requests.Response) -> None:
+        remaining = r.headers.get("Ratelimit-Remaining")
+        reset = r.headers.get("Ratelimit-Reset")
+        with self._lock:
+            if remaining is not None and remaining.isdigit():
+                self.remaining = int(remaining)
+            if reset is not None and reset.isdigit():
+                self.reset_at = float(reset)
+
+    def block(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+    def block_quota(self, until: float) -> None:
+        with self._lock:
+            self.quota_blocked_until = until
+
+
+class HttpClient:
+    # Shared transport for the discovery fetchers: one pooled session,
+    # retries with jittered exponential backoff, and per-host throttling
+    # driven by Helix Ratelimit-* headers and YouTube quota errors.
+
+    def __init__(
+        self,
+        user_agent: str = "viral-engine/1.0",
+        pool_size: int = 10,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 60.0,
+        timeout: float = 30,
+        low_watermark: int = 5,
+    ) -> None:
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": user_agent})
+
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.low_watermark = low_watermark
+
+        self._throttles: Dict[str, _HostThrottle] = {}
+        self._throttles_lock = threading.Lock()
+
+    def _throttle(self, url: str) -> _HostThrottle:
+        host = urlsplit(url).netloc
+        with self._throttles_lock:
+            t = self._throttles.get(host)
+            if t is None:
+                t = self._throttles[host] = _HostThrottle(self.low_watermark)
+            return t
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        cap = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return random.uniform(0, cap)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        on_unauthorized: Optional[
+            Callable[[Dict[str, str]], Dict[str, str]]
+        ] = None,
+        on_response: Optional[Callable[[requests.Response], None]] = None,
+    ) -> requests.Response:
+        # Returns the final response without raising on HTTP status, so
+        # callers can still handle 304s and decide how to fail.
+        # `on_unauthorized` gets the rejected request's headers and returns
+        # fresh auth headers; `on_response` sees every response the server
+        # sent, retried ones included (quota accounting).
+        host = urlsplit(url).netloc
+        throttle = self._throttle(url)
+        headers = dict(headers or {})
+        refreshed = False
+        attempt = 0
+
+        while True:
+            throttle.acquire()
+            try:
+                r = self.session.request(
+                    method, url, params=params, headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                wait = self._backoff(attempt)
+                print(f"⚠️ {type(e).__name__} on {host}, retry in {wait:.1f}s")
+                time.sleep(wait)
+                attempt += 1
+                continue
+
+            throttle.update(r)
+            if on_response is not None:
+                on_response(r)
+
+            if r.status_code == 401 and on_unauthorized is not None and not refreshed:
+                # Expired/revoked token: refresh once, retry right away
+                headers.update(on_unauthorized(headers))
+                refreshed = True
+                continue
+
+            delay: Optional[float] = None
+            if r.status_code in RETRY_STATUSES:
+                delay = self._retry_after(r, attempt)
+                if r.status_code == 429:
+                    throttle.block(delay)
+            elif r.status_code == 403:
+                reason = _youtube_error_reason(r)
+                if reason in YT_QUOTA_REASONS:
+                    throttle.block_quota(_next_quota_reset())
+                    raise QuotaExceededError(f"YouTube API quota exhausted ({reason})")
+                if reason in YT_RATE_REASONS:
+                    delay = self._backoff(attempt + 2)
+                    throttle.block(delay)
+
+            if delay is None or attempt >= self.max_retries:
+                return r
+
+            print(f"⚠️ HTTP {r.status_code} from {host}, retry in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def _retry_after(self, r: requests.Response, attempt: int) -> float:
+        retry_after = r.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+
+        reset = r.headers.get("Ratelimit-Reset", "")
+        if r.status_code == 429 and reset.isdigit():
+            wait = max(float(reset) - time.time(), 0) + random.uniform(0, 1)
+            return min(wait, self.backoff_max)
+
+        return self._backoff(attempt)
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from engine.scoring.virality_score import score_item
+from .youtube_fetcher import YouTubeVideo
+from .twitch_fetcher import TwitchVOD
+
+
+SNAPSHOT_PATH = Path("data/discovery_snapshots.json")
+
+Item = Union[YouTubeVideo, TwitchVOD]
+
+# (max item age in hours, stats refresh interval in minutes)
+REFRESH_TIERS = [(6, 15), (24, 60), (72, 240), (168, 720)]
+# Past the last tier: hot items refresh daily, cold ones never
+COLD_REFRESH_MIN = 24 * 60
+
+HOT_PERCENTILE = 0.75  # top quarter of stored scores counts as "hot"
+HISTORY_LEN = 12  # stats points kept per item
+FLAT_POINT_S = 3600  # record an unchanged point at most this often
+
+
+def item_key(item: Item) -> str:
+    if isinstance(item, YouTubeVideo):
+        return f"youtube:{item.video_id}"
+    return f"twitch:{item.vod_id}"
+
+
+def _published(item: Dict[str, Any]) -> str:
+    # Works on the stored (asdict) form of either item type
+    return str(item.get("published_at") or item.get("created_at") or "")
+
+
+def _views(item: Item) -> int:
+    return item.views if isinstance(item, YouTubeVideo) else item.view_count
+
+
+def _age_hours(published: str, now: float) -> float:
+    if not published:
+        return 0.0
+    dt = datetime.fromisoformat(published.replace("Z", "+00:00"))
+    return max((now - dt.astimezone(timezone.utc).timestamp()) / 3600, 0.0)
+
+
+class SnapshotStore:
+    # Local copy of every discovered item plus a short history of its stats.
+    #
+    # Discovery only fetches full metadata for ids it hasn't seen; known ids
+    # get their stats refreshed on a schedule that depends on age and score,
+    # and the history gives scoring a real view velocity between snapshots.
+
+    def __init__(self, path: str | Path = SNAPSHOT_PATH) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = self._read()
+        self._hot_score = float("inf")
+        self.begin_cycle()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (json.JSONDecodeError, OSError):
+            print("⚠️ Snapshot store corrupted. Starting empty.")
+            return {}
+
+    def begin_cycle(self) -> None:
+        with self._lock:
+            scores = sorted(e.get("score", 0.0) for e in self._data.values())
+        if scores:
+            idx = min(int(len(scores) * HOT_PERCENTILE), len(scores) - 1)
+            self._hot_score = scores[idx]
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def get(self, key: str) -> Optional[Item]:
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None:
+            return None
+        if key.startswith("youtube:"):
+            return YouTubeVideo(**entry["item"])
+        return TwitchVOD(**entry["item"])
+
+    def refresh_interval_s(
+        self, key: str, now: Optional[float] = None
+    ) -> Optional[float]:
+        # None means "never refresh"
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None:
+            return 0.0
+
+        age = _age_hours(_published(entry["item"]), now)
+        hot = entry.get("score", 0.0) >= self._hot_score
+
+        for max_age, minutes in REFRESH_TIERS:
+            if age <= max_age:
+                return minutes * 60 / (2 if hot else 1)
+        return COLD_REFRESH_MIN * 60 if hot else None
+
+    def is_due(self, key: str, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        interval = self.refresh_interval_s(key, now)
+        if interval is None:
+            return False
+        with self._lock:
+            refreshed_at = self._data.get(key, {}).get("refreshed_at", 0.0)
+        return now - refreshed_at >= interval
+
+    def due_keys(self, platform: str, now: Optional[float] = None) -> List[str]:
+        now = time.time() if now is None else now
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(f"{platform}:")]
+        return [k for k in keys if self.is_due(k, now)]
+
+    def record(self, item: Item) -> Item:
+        # Store fresh stats for an item; returns it with view_velocity filled in
+        key = item_key(item)
+        now = time.time()
+        views = _views(item)
+
+        with self._lock:
+            entry = self._data.setdefault(key, {"first_seen": now, "history": []})
+            history: List[List[float]] = entry["history"]
+
+            last = history[-1] if history else None
+            if last is None or last[1] != views or now - last[0] >= FLAT_POINT_S:
+                history.append([now, views])
+                del history[:-HISTORY_LEN]
+
+            velocity: Optional[float] = None
+            if len(history) >= 2:
+                (t0, v0), (t1, v1) = history[-2], history[-1]
+                if t1 > t0:
+                    velocity = max(v1 - v0, 0) / ((t1 - t0) / 3600)
+
+            item = replace(item, view_velocity=velocity)
+            entry["item"] = asdict(item)
+            entry["refreshed_at"] = now
+            entry["score"] = score_item(item)
+        return item
+
+    def prune(self, days_lookback: int) -> None:
+        now = time.time()
+        with self._lock:
+            dead = [
+                k
+                for k, e in self._data.items()
+                if _age_hours(_published(e["item"]), now) > days_lookback * 24
+            ]
+            for k in dead:
+                del self._data[k]
+
+    def save(self) -> None:
+        # Under the lock: concurrent saves share the tmp name, and the last
+        # replace must be the newest state
+        with self._lock:
+            payload = json.dumps(self._data)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".json.tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            os.replace(tmp, self.path)
@@ -1,14 +1,25 @@
 from __future__ import annotations
 
+import threading
+import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 import requests
 
+from engine.utils.disk_cache import CACHE_DIR, JsonCache
+from .http_cache import ResponseCache, cache_key
+from .http_client import HttpClient
+
 
 TWITCH_OAUTH = "https://id.twitch.tv/oauth2/token"
 TWITCH_HELIX = "https://api.twitch.tv/helix"
 
+HELIX_USERS_BATCH = 100  # max `login` params per /users call
+HELIX_VIDEOS_BATCH = 100  # max `id` params per /videos call
+TOKEN_EXPIRY_MARGIN_S = 300  # refresh a bit before Twitch would reject it
+UNKNOWN_LOGIN_TTL_S = 3600  # retry logins that didn't resolve after an hour
+
 
 @dataclass
 class TwitchVOD:
@@ -23,6 +34,8 @@ class TwitchVOD:
     view_count: int
     user_id: str
     user_login: str
+    # Views/hour between the last two stats snapshots (None until known)
+    view_velocity: Optional[float] = None
 
 
 def _parse_utc(dt_str: str) -> datetime:
@@ -38,15 +51,37 @@ class TwitchFetcher:
         client_id: str,
         client_secret: str,
         user_agent: str = "viral-engine/1.0",
+        user_cache_ttl_hours: float = 24 * 7,
+        cache: Optional[ResponseCache] = None,
+        client: Optional[HttpClient] = None,
     ) -> None:
         self.client_id = client_id
         self.client_secret = client_secret
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": user_agent})
+        self.http = client or HttpClient(user_agent=user_agent)
+        self.cache = cache
         self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+
+        # login -> {"id", "login"}; {} marks a login Twitch doesn't know
+        self.user_cache_ttl_s = user_cache_ttl_hours * 3600
+        self._users = JsonCache(CACHE_DIR / "twitch_users.json")
+        self._token_store = JsonCache(CACHE_DIR / "twitch_token.json")
 
     def _get_token(self) -> str:
-        if self._token is not None:
+        # Discovery workers share one fetcher; only mint one token
+        with self._token_lock:
+            return self._get_token_locked()
+
+    def _get_token_locked(self) -> str:
+        if self._token is not None and time.time() < self._token_expires_at:
+            return self._token
+
+        # Reuse the token from a previous run if it's still valid
+        stored = self._token_store.get_entry(self.client_id)
+        if stored and time.time() < stored.get("expires_at", 0):
+            self._token = str(stored["value"])
+            self._token_expires_at = float(stored["expires_at"])
             return self._token
 
         params = {
@@ -55,7 +90,7 @@ class TwitchFetcher:
             "grant_type": "client_credentials",
         }
 
-        r = self.session.post(TWITCH_OAUTH, params=params, timeout=30)
+        r = self.http.post(TWITCH_OAUTH, params=params)
         r.raise_for_status()
 
         data = r.json()
@@ -64,27 +99,96 @@ class TwitchFetcher:
         if not token:
             raise RuntimeError("Failed to obtain Twitch OAuth token")
 
+        expires_in = int(data.get("expires_in") or 3600)
+        ttl = max(expires_in - TOKEN_EXPIRY_MARGIN_S, 60)
+
         self._token = str(token)
+        self._token_expires_at = time.time() + ttl
+        self._token_store.set(self.client_id, self._token, ttl)
+        self._token_store.save()
         return self._token
 
-    def _helix_get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        token = self._get_token()
-        headers = {
-            "Client-Id": self.client_id,
-            "Authorization": f"Bearer {token}",
-        }
-        r = self.session.get(
-            f"{TWITCH_HELIX}{path}", params=params, headers=headers, timeout=30
-        )
-        r.raise_for_status()
-        return r.json()
+    def _refresh_token(self, rejected: Dict[str, str]) -> Dict[str, str]:
+        # Helix said 401: drop the cached token (memory + disk) and mint anew,
+        # unless a concurrent 401 already replaced the one that was rejected
+        with self._token_lock:
+            current = f"Bearer {self._token}" if self._token else None
+            if (
+                current is not None
+                and current != rejected.get("Authorization")
+                and time.time() < self._token_expires_at
+            ):
+                return {"Authorization": current}
+            self._token = None
+            self._token_expires_at = 0.0
+            self._token_store.delete(self.client_id)
+            token = self._get_token_locked()
+        return {"Authorization": f"Bearer {token}"}
+
+    def _helix_get(
+        self, path: str, params: Dict[str, Any], cached: bool = True
+    ) -> Dict[str, Any]:
+        url = f"{TWITCH_HELIX}{path}"
+
+        def fetch(extra: Dict[str, str]) -> requests.Response:
+            headers = {
+                "Client-Id": self.client_id,
+                "Authorization": f"Bearer {self._get_token()}",
+                **extra,
+            }
+            return self.http.get(
+                url,
+                params=params,
+                headers=headers,
+                on_unauthorized=self._refresh_token,
+            )
+
+        if self.cache is None or not cached:
+            r = fetch({})
+            r.raise_for_status()
+            return r.json()
+
+        # Helix has no ETags; rely on TTL freshness only
+        return self.cache.get_json(cache_key(url, params), fetch)
+
+    def resolve_user_ids(self, logins: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        wanted = sorted({l.strip().lower() for l in logins if l and l.strip()})
+
+        out: Dict[str, Dict[str, str]] = {}
+        missing: List[str] = []
+        for login in wanted:
+            cached = self._users.get(login)
+            if cached is None:
+                missing.append(login)
+            elif cached:
+                out[login] = cached
+
+        for i in range(0, len(missing), HELIX_USERS_BATCH):
+            batch = missing[i : i + HELIX_USERS_BATCH]
+            # Has its own long-lived cache above
+            data = self._helix_get("/users", {"login": batch}, cached=False).get(
+                "data", []
+            )
+
+            found = set()
+            for u in data:
+                login = str(u.get("login", "")).lower()
+                user = {"id": u["id"], "login": login}
+                self._users.set(login, user, self.user_cache_ttl_s)
+                out[login] = user
+                found.add(login)
+
+            for login in batch:
+                if login not in found:
+                    self._users.set(login, {}, UNKNOWN_LOGIN_TTL_S)
+
+        if missing:
+            print(f"👤 Resolved {len(missing)} Twitch logins ({len(wanted)} total)")
+        self._users.save()
+        return out
 
     def resolve_user_id(self, login: str) -> Optional[Dict[str, str]]:
-        data = self._helix_get("/users", {"login": login}).get("data", [])
-        if not data:
-            return None
-        u = data[0]
-        return {"id": u["id"], "login": u.get("login", login)}
+        return self.resolve_user_ids([login]).get(login.strip().lower())
 
     def fetch_recent_vods(
         self,
@@ -136,3 +240,14 @@ class TwitchFetcher:
 
         out.sort(key=lambda x: x.created_at, reverse=True)
         return out
+
+    def fetch_view_counts(self, vod_ids: Iterable[str]) -> Dict[str, int]:
+        # Live view counts for known VODs, 100 ids per /videos call
+        ids = list(dict.fromkeys(v for v in vod_ids if v))
+        out: Dict[str, int] = {}
+        for i in range(0, len(ids), HELIX_VIDEOS_BATCH):
+            batch = ids[i : i + HELIX_VIDEOS_BATCH]
+            payload = self._helix_get("/videos", {"id": batch}, cached=False)
+            for it in payload.get("data", []):
+                out[str(it.get("id", ""))] = int(it.get("view_count", 0) or 0)
+        return out
@@ -1,13 +1,24 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional
 import requests
 
+from engine.utils.disk_cache import CACHE_DIR, JsonCache
+from .http_cache import ResponseCache, cache_key
+from .http_client import HttpClient
+
 
 YOUTUBE_API = "https://www.googleapis.com/youtube/v3"
 
+# Data API quota units per call (see YouTube quota calculator)
+QUOTA_COST = {"search": 100, "videos": 1, "playlistItems": 1, "channels": 1}
+
+YOUTUBE_ID_BATCH = 50  # max ids per videos.list / channels.list call
+UPLOADS_PLAYLIST_TTL_S = 30 * 24 * 3600
+
 
 @dataclass
 class YouTubeVideo:
@@ -23,17 +34,95 @@ class YouTubeVideo:
     views: int
     likes: int
     comments: int
+    # Views/hour between the last two stats snapshots (None until known)
+    view_velocity: Optional[float] = None
 
 
 def _utc_iso(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
+def _parse_utc(dt_str: str) -> datetime:
+    return datetime.fromisoformat(dt_str.replace("Z", "+00:00")).astimezone(
+        timezone.utc
+    )
+
+
 class YouTubeFetcher:
-    def __init__(self, api_key: str, user_agent: str = "viral-engine/1.0") -> None:
+    def __init__(
+        self,
+        api_key: str,
+        user_agent: str = "viral-engine/1.0",
+        cache: Optional[ResponseCache] = None,
+        client: Optional[HttpClient] = None,
+    ) -> None:
         self.api_key = api_key
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": user_agent})
+        self.http = client or HttpClient(user_agent=user_agent)
+        self.cache = cache
+
+        self.quota_used = 0
+        self._quota_lock = threading.Lock()
+
+        # channel id -> uploads playlist id (practically never changes)
+        self._playlists = JsonCache(CACHE_DIR / "youtube_uploads_playlists.json")
+
+    def reset_quota(self) -> int:
+        with self._quota_lock:
+            used, self.quota_used = self.quota_used, 0
+        return used
+
+    def _get(
+        self, endpoint: str, params: Dict[str, Any], cached: bool = True
+    ) -> Dict[str, Any]:
+        url = f"{YOUTUBE_API}/{endpoint}"
+
+        def charge(r: requests.Response) -> None:
+            # Per answered attempt: a retried call costs each time
+            with self._quota_lock:
+                self.quota_used += QUOTA_COST.get(endpoint, 1)
+
+        def fetch(headers: Dict[str, str]) -> requests.Response:
+            return self.http.get(
+                url,
+                params={**params, "key": self.api_key},
+                headers=headers,
+                on_response=charge,
+            )
+
+        if self.cache is None or not cached:
+            r = fetch({})
+            r.raise_for_status()
+            return r.json()
+
+        # Data API responses carry ETags, so stale entries revalidate cheaply
+        return self.cache.get_json(cache_key(url, params), fetch, conditional=True)
+
+    def _to_video(
+        self,
+        v: Dict[str, Any],
+        creator_id: str,
+        creator_label: str,
+        channel_id: str,
+        fallback_snippet: Optional[Dict[str, Any]] = None,
+    ) -> YouTubeVideo:
+        vid = v.get("id", "")
+        snip = v.get("snippet") or fallback_snippet or {}
+        stats = v.get("statistics") or {}
+
+        return YouTubeVideo(
+            platform="youtube",
+            creator_id=creator_id,
+            creator_label=creator_label,
+            video_id=vid,
+            title=snip.get("title", ""),
+            published_at=snip.get("publishedAt", ""),
+            channel_id=snip.get("channelId", channel_id),
+            channel_title=snip.get("channelTitle", ""),
+            url=f"https://www.youtube.com/watch?v={vid}",
+            views=int(stats.get("viewCount", 0) or 0),
+            likes=int(stats.get("likeCount", 0) or 0),
+            comments=int(stats.get("commentCount", 0) or 0),
+        )
 
     def fetch_recent_videos(
         self,
@@ -43,7 +132,11 @@ class YouTubeFetcher:
         days_lookback: int = 14,
         max_results: int = 25,
     ) -> List[YouTubeVideo]:
-        after = datetime.now(timezone.utc) - timedelta(days=days_lookback)
+        # Hour granularity keeps the request (and its cache key) stable
+        # between cycles; newer-than-window items are filtered by score anyway
+        after = (datetime.now(timezone.utc) - timedelta(days=days_lookback)).replace(
+            minute=0, second=0, microsecond=0
+        )
 
         # 1) search for recent videos on channel
         search_params = {
@@ -53,12 +146,9 @@ class YouTubeFetcher:
             "order": "date",
             "type": "video",
             "publishedAfter": _utc_iso(after),
-            "key": self.api_key,
         }
 
-        r = self.session.get(f"{YOUTUBE_API}/search", params=search_params, timeout=30)
-        r.raise_for_status()
-        items = r.json().get("items", [])
+        items = self._get("search", search_params).get("items", [])
 
         video_ids: List[str] = []
         snippets: Dict[str, Dict[str, Any]] = {}
@@ -75,40 +165,126 @@ class YouTubeFetcher:
             return []
 
         # 2) fetch stats for those videos
-        stats_params = {
-            "part": "snippet,statistics",
-            "id": ",".join(video_ids),
-            "maxResults": 50,
-            "key": self.api_key,
-        }
+        vitems = self.fetch_videos(video_ids)
+
+        out = [
+            self._to_video(v, creator_id, creator_label, channel_id, snippets.get(vid))
+            for vid, v in vitems.items()
+        ]
 
-        r2 = self.session.get(f"{YOUTUBE_API}/videos", params=stats_params, timeout=30)
-        r2.raise_for_status()
-        vitems = r2.json().get("items", [])
-
-        out: List[YouTubeVideo] = []
-        for v in vitems:
-            vid = v.get("id", "")
-            snip = v.get("snippet") or snippets.get(vid) or {}
-            stats = v.get("statistics") or {}
-
-            out.append(
-                YouTubeVideo(
-                    platform="youtube",
-                    creator_id=creator_id,
-                    creator_label=creator_label,
-                    video_id=vid,
-                    title=snip.get("title", ""),
-                    published_at=snip.get("publishedAt", ""),
-                    channel_id=snip.get("channelId", channel_id),
-                    channel_title=snip.get("channelTitle", ""),
-                    url=f"https://www.youtube.com/watch?v={vid}",
-                    views=int(stats.get("viewCount", 0) or 0),
-                    likes=int(stats.get("likeCount", 0) or 0),
-                    comments=int(stats.get("commentCount", 0) or 0),
+        # Ensure newest first
+        out.sort(key=lambda x: x.published_at, reverse=True)
+        return out
+
+    # ----------------------------
+    # QUOTA-EFFICIENT (PLAYLIST) MODE
+    # ----------------------------
+    def uploads_playlists(self, channel_ids: Iterable[str]) -> Dict[str, str]:
+        wanted = sorted({c for c in channel_ids if c})
+
+        out: Dict[str, str] = {}
+        missing: List[str] = []
+        for cid in wanted:
+            cached = self._playlists.get(cid)
+            if cached:
+                out[cid] = cached
+            else:
+                missing.append(cid)
+
+        for i in range(0, len(missing), YOUTUBE_ID_BATCH):
+            batch = missing[i : i + YOUTUBE_ID_BATCH]
+            payload = self._get(
+                "channels",
+                {
+                    "part": "contentDetails",
+                    "id": ",".join(batch),
+                    "maxResults": YOUTUBE_ID_BATCH,
+                },
+            )
+            for ch in payload.get("items", []):
+                uploads = (
+                    (ch.get("contentDetails") or {})
+                    .get("relatedPlaylists", {})
+                    .get("uploads")
                 )
+                if uploads:
+                    out[ch["id"]] = uploads
+                    self._playlists.set(ch["id"], uploads, UPLOADS_PLAYLIST_TTL_S)
+
+        self._playlists.save()
+        return out
+
+    def recent_upload_ids(
+        self,
+        playlist_id: str,
+        days_lookback: int = 14,
+        max_results: int = 25,
+    ) -> List[str]:
+        after = datetime.now(timezone.utc) - timedelta(days=days_lookback)
+
+        payload = self._get(
+            "playlistItems",
+            {
+                "part": "contentDetails",
+                "playlistId": playlist_id,
+                "maxResults": min(max_results, 50),
+            },
+        )
+
+        ids: List[str] = []
+        for it in payload.get("items", []):
+            details = it.get("contentDetails") or {}
+            vid = details.get("videoId")
+            published = details.get("videoPublishedAt")
+            # Private/deleted uploads have no publish date
+            if not vid or not published:
+                continue
+            if _parse_utc(published) < after:
+                continue
+            ids.append(vid)
+        return ids
+
+    def fetch_videos(
+        self,
+        video_ids: Iterable[str],
+        part: str = "snippet,statistics",
+        cached: bool = True,
+    ) -> Dict[str, Dict[str, Any]]:
+        ids = list(dict.fromkeys(v for v in video_ids if v))
+
+        out: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(ids), YOUTUBE_ID_BATCH):
+            batch = ids[i : i + YOUTUBE_ID_BATCH]
+            payload = self._get(
+                "videos",
+                {"part": part, "id": ",".join(batch), "maxResults": YOUTUBE_ID_BATCH},
+                cached=cached,
             )
+            for v in payload.get("items", []):
+                out[v.get("id", "")] = v
+        return out
 
-        # Ensure newest first
+    def build_videos(
+        self,
+        creator_id: str,
+        creator_label: str,
+        channel_id: str,
+        video_ids: Iterable[str],
+        vitems: Dict[str, Dict[str, Any]],
+    ) -> List[YouTubeVideo]:
+        out = [
+            self._to_video(vitems[vid], creator_id, creator_label, channel_id)
+            for vid in video_ids
+            if vid in vitems
+        ]
         out.sort(key=lambda x: x.published_at, reverse=True)
         return out
+
+    def with_stats(self, video: YouTubeVideo, v: Dict[str, Any]) -> YouTubeVideo:
+        stats = v.get("statistics") or {}
+        return replace(
+            video,
+            views=int(stats.get("viewCount", 0) or 0),
+            likes=int(stats.get("likeCount", 0) or 0),
+            comments=int(stats.get("commentCount", 0) or 0),
+        )
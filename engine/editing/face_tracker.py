@@ -1,9 +1,18 @@
+import os
 import cv2
-from typing import Any
+from typing import Any, Optional, Tuple
 import mediapipe as mp
 
 mp_face = mp.solutions.face_detection
 
+# Detection runs on every Nth frame only, on a copy this wide
+FACE_DETECT_EVERY = int(os.getenv("FACE_DETECT_EVERY", "5"))
+FACE_DETECT_WIDTH = 320
+# Per-frame pull of the crop center toward the last detection (EMA)
+FACE_SMOOTHING = float(os.getenv("FACE_SMOOTHING", "0.15"))
+# Detections in a row without a face before drifting back to the middle
+FACE_LOST_AFTER = 6
+
 
 def get_face_center(frame):
     with mp_face.FaceDetection(model_selection=1, min_detection_confidence=0.5) as detector:
@@ -18,3 +27,81 @@ def get_face_center(frame):
             return cx, cy
 
     return None
+
+
+class FaceTracker:
+    # One detector for the whole clip. update() is called for every frame
+    # and returns a smoothed face center in frame pixels; the model only
+    # sees a downscaled frame every `detect_every` frames, and the center
+    # eases toward each new detection in between.
+
+    def __init__(
+        self,
+        detect_every: int = FACE_DETECT_EVERY,
+        detect_width: int = FACE_DETECT_WIDTH,
+        smoothing: float = FACE_SMOOTHING,
+        min_confidence: float = 0.5,
+    ) -> None:
+        self.detect_every = max(1, detect_every)
+        self.detect_width = detect_width
+        self.smoothing = smoothing
+        self.detector = mp_face.FaceDetection(
+            model_selection=1, min_detection_confidence=min_confidence
+        )
+        self.frames = 0
+        self.detections = 0
+        self._misses = 0
+        self._target: Optional[Tuple[float, float]] = None
+        self._center: Optional[Tuple[float, float]] = None
+
+    def _detect(self, frame) -> Optional[Tuple[float, float]]:
+        h, w = frame.shape[:2]
+        if w > self.detect_width:
+            small = cv2.resize(
+                frame,
+                (self.detect_width, max(1, int(h * self.detect_width / w))),
+                interpolation=cv2.INTER_AREA,
+            )
+        else:
+            small = frame
+        results: Any = self.detector.process(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+        self.detections += 1
+
+        if not getattr(results, "detections", None):
+            return None
+        # Relative box, so it maps straight back onto the full frame
+        box = results.detections[0].location_data.relative_bounding_box
+        return (box.xmin + box.width / 2) * w, (box.ymin + box.height / 2) * h
+
+    def update(self, frame) -> Tuple[int, int]:
+        h, w = frame.shape[:2]
+        middle = (w / 2, h / 2)
+
+        if self.frames % self.detect_every == 0:
+            found = self._detect(frame)
+            if found is not None:
+                self._target = found
+                self._misses = 0
+            else:
+                self._misses += 1
+                if self._misses >= FACE_LOST_AFTER:
+                    self._target = None
+        self.frames += 1
+
+        target = self._target or middle
+        if self._center is None:
+            self._center = target
+        else:
+            a = self.smoothing
+            cx, cy = self._center
+            self._center = (cx + a * (target[0] - cx), cy + a * (target[1] - cy))
+        return int(self._center[0]), int(self._center[1])
+
+    def close(self) -> None:
+        self.detector.close()
+
+    def __enter__(self) -> "FaceTracker":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
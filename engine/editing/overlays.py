@@ -1,6 +1,8 @@
 import cv2
 from pathlib import Path
 
+from engine.utils import metrics
+
 
 def resize_icon(img, max_w):
     h, w = img.shape[:2]
@@ -39,10 +41,12 @@ def add_overlays(video_path: Path, output_path: Path):
 
     print("🎨 Rendering overlays...")
 
+    frames = 0
     while True:
         ret, frame = cap.read()
         if not ret:
             break
+        frames += 1
 
         overlay(frame, logo, 20, 20)
         overlay(frame, like, w - 150, h - 300)
@@ -52,3 +56,4 @@ def add_overlays(video_path: Path, output_path: Path):
 
     cap.release()
     out.release()
+    metrics.add(frames=frames)
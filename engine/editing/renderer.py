@@ -2,6 +2,8 @@ from pathlib import Path
 import subprocess
 from .shorts_cropper import crop_to_shorts
 from .overlays import add_overlays
+from engine.utils.artifacts import scratch_path
+from engine.utils.metrics import add, file_size, measure
 
 def merge_audio(original_video: Path, silent_video: Path, final_video: Path):
     print("🔊 Merging original audio...")
@@ -30,21 +32,28 @@ def merge_audio(original_video: Path, silent_video: Path, final_video: Path):
 
 
 def render_shorts(clip_path: Path):
-    shorts_path = clip_path.with_name(clip_path.stem + "_shorts.mp4")
-    overlay_path = clip_path.with_name(clip_path.stem + "_overlay.mp4")
-    final_path = clip_path.with_name(clip_path.stem + "_final.mp4")
+    # Intermediates and the final are written to scratch; the clip itself is
+    # left alone (it's a cached artifact)
+    clip_path = Path(clip_path)
+    shorts_path = scratch_path("render", clip_path.stem + "_shorts.mp4")
+    overlay_path = scratch_path("render", clip_path.stem + "_overlay.mp4")
+    final_path = scratch_path("render", clip_path.stem + "_final.mp4")
 
     print("📱 Creating cinematic shorts layout...")
-    crop_to_shorts(clip_path, shorts_path)
+    with measure("crop_to_shorts"):
+        crop_to_shorts(clip_path, shorts_path)
 
     print("🎨 Adding overlays...")
-    add_overlays(shorts_path, overlay_path)
+    with measure("add_overlays"):
+        add_overlays(shorts_path, overlay_path)
 
-    merge_audio(clip_path, overlay_path, final_path)
+    with measure("merge_audio"):
+        merge_audio(clip_path, overlay_path, final_path)
+        add(nbytes=file_size(final_path))
 
     # Cleanup
     print("🧹 Cleaning up temporary files...")
-    for f in [clip_path, shorts_path, overlay_path]:
+    for f in [shorts_path, overlay_path]:
         if f.exists():
             f.unlink()
 
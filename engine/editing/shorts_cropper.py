@@ -1,47 +1,90 @@
+import os
 import cv2
 import numpy as np
 from pathlib import Path
 
-def crop_to_shorts(input_path: Path, output_path: Path):
-    cap = cv2.VideoCapture(str(input_path))
+from engine.utils import metrics
 
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    W_out, H_out = 1080, 1920
+# "fit": whole frame fit to width over a blurred copy of itself.
+# "face": full-height 9:16 window that follows the speaker's face.
+CROP_MODE = os.getenv("CROP_MODE", "fit").strip().lower()
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out = cv2.VideoWriter(str(output_path), fourcc, fps, (W_out, H_out))
 
-    print("📱 Converting to cinematic Shorts format...")
+def _fit_frame(frame, W_out, H_out):
+    h, w = frame.shape[:2]
+
+    # --- BLURRED BACKGROUND ---
+    bg = cv2.resize(frame, (W_out, H_out))
+    bg = cv2.GaussianBlur(bg, (55, 55), 0)
+
+    # --- FOREGROUND (FIT TO WIDTH) ---
+    scale = W_out / w
+    new_w = W_out
+    new_h = int(h * scale)
+
+    fg = cv2.resize(frame, (new_w, new_h))
+
+    # --- CENTER FOREGROUND ---
+    y_offset = (H_out - new_h) // 2
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    # Clip if taller than screen
+    if y_offset < 0:
+        fg = fg[abs(y_offset):abs(y_offset)+H_out, :]
+        y_offset = 0
 
-        h, w = frame.shape[:2]
+    bg[y_offset:y_offset+fg.shape[0], 0:fg.shape[1]] = fg
+    return bg
 
-        # --- BLURRED BACKGROUND ---
-        bg = cv2.resize(frame, (W_out, H_out))
-        bg = cv2.GaussianBlur(bg, (55, 55), 0)
 
-        # --- FOREGROUND (FIT TO WIDTH) ---
-        scale = W_out / w
-        new_w = W_out
-        new_h = int(h * scale)
+def _face_frame(frame, cx, W_out, H_out):
+    h, w = frame.shape[:2]
 
-        fg = cv2.resize(frame, (new_w, new_h))
+    # Widest 9:16 window at full height, centered on the face and kept
+    # inside the frame
+    crop_w = int(h * W_out / H_out)
+    x0 = min(max(cx - crop_w // 2, 0), w - crop_w)
+    return cv2.resize(frame[:, x0:x0 + crop_w], (W_out, H_out))
 
-        # --- CENTER FOREGROUND ---
-        y_offset = (H_out - new_h) // 2
 
-        # Clip if taller than screen
-        if y_offset < 0:
-            fg = fg[abs(y_offset):abs(y_offset)+H_out, :]
-            y_offset = 0
+def crop_to_shorts(input_path: Path, output_path: Path, mode=None):
+    cap = cv2.VideoCapture(str(input_path))
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    W_out, H_out = 1080, 1920
+
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    out = cv2.VideoWriter(str(output_path), fourcc, fps, (W_out, H_out))
+
+    mode = mode or CROP_MODE
+    width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+    height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    tracker = None
+    if mode == "face" and height * W_out / H_out < width:
+        from .face_tracker import FaceTracker  # mediapipe only for this mode
 
-        bg[y_offset:y_offset+fg.shape[0], 0:fg.shape[1]] = fg
+        print("📱 Converting to Shorts format (face-tracked crop)...")
+        tracker = FaceTracker()
+    else:
+        # Already 9:16 or narrower: nothing to pan across
+        print("📱 Converting to cinematic Shorts format...")
 
-        out.write(bg)
+    frames = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames += 1
 
-    cap.release()
-    out.release()
+            if tracker is not None:
+                cx, _ = tracker.update(frame)
+                out.write(_face_frame(frame, cx, W_out, H_out))
+            else:
+                out.write(_fit_frame(frame, W_out, H_out))
+    finally:
+        if tracker is not None:
+            print(f"🙂 Face detection ran on {tracker.detections}/{frames} frames")
+            tracker.close()
+        cap.release()
+        out.release()
+    metrics.add(frames=frames)
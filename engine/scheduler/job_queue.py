@@ -0,0 +1,449 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from engine.scoring.ranker import Candidate, candidate_from_dict, candidate_id
+from engine.utils.registry import used_video_ids
+from engine.utils.registry_sqlite import JOURNAL_MODE, SYNCHRONOUS
+from engine.scheduler.pipeline import (
+    STAGES,
+    Cancelled,
+    Job,
+    Skip,
+    abandon,
+    ready_count,
+    run_stage,
+)
+
+
+QUEUE_PATH = Path("data/jobs.db")
+
+LEASE_S = 15 * 60  # a worker that stops heartbeating loses its job after this
+MAX_ATTEMPTS = 3  # per stage, counting reclaimed leases
+RETRY_DELAY_S = 5 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    video_id TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    available_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, stage, available_at);
+"""
+
+# Job statuses. A skipped or failed row keeps its video from being queued
+# again; a done one is requeued when the source comes round for its next
+# moment.
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def worker_id(n: int = 0) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{n}"
+
+
+def _dump_job(job: Job) -> str:
+    return json.dumps(
+        {
+            "item": asdict(job.item),
+            "video_path": str(job.video_path) if job.video_path else None,
+            "start": job.start,
+            "end": job.end,
+            "clip_path": str(job.clip_path) if job.clip_path else None,
+            "final_path": str(job.final_path) if job.final_path else None,
+        }
+    )
+
+
+def _load_job(video_id: str, payload: str) -> Job:
+    d = json.loads(payload)
+    item = candidate_from_dict(d["item"])
+
+    def path(key: str) -> Optional[Path]:
+        return Path(d[key]) if d.get(key) else None
+
+    return Job(
+        item=item,
+        video_id=video_id,
+        video_path=path("video_path"),
+        start=float(d.get("start") or 0.0),
+        end=float(d.get("end") or 0.0),
+        clip_path=path("clip_path"),
+        final_path=path("final_path"),
+    )
+
+
+@dataclass
+class Lease:
+    video_id: str
+    stage: str
+    attempts: int
+    job: Job
+
+
+class JobQueue:
+    # Shared production queue in SQLite. One row per source video moves
+    # through the stages; a worker owns a row only while its lease is fresh,
+    # so several processes, or hosts sharing the data directory, can work
+    # the same queue. A lease that isn't renewed is simply claimable again.
+    #
+    # Same journal and sync settings as the registry (see registry_sqlite),
+    # which the workers write too: both files can live on the shared disk.
+
+    def __init__(self, path: str | Path = QUEUE_PATH) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ----------------------------
+    # PRODUCER SIDE
+    # ----------------------------
+    def enqueue(self, item: Candidate, priority: float = 0.0) -> bool:
+        # False if this video is in flight or was given up on (by anyone)
+        vid = candidate_id(item)
+        now = time.time()
+        job = Job(item=item, video_id=vid)
+        with self._tx() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (video_id, stage, status, payload,"
+                " priority, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(video_id) DO UPDATE SET stage = excluded.stage,"
+                " status = excluded.status, payload = excluded.payload,"
+                " priority = excluded.priority, attempts = 0, available_at = 0,"
+                " error = NULL, updated_at = excluded.updated_at"
+                " WHERE jobs.status = ?",
+                (vid, STAGES[0], QUEUED, _dump_job(job), priority, now, now, DONE),
+            )
+        return cur.rowcount == 1
+
+    def known_ids(self) -> Set[str]:
+        # Everything enqueue() would refuse
+        rows = self._conn().execute(
+            "SELECT video_id FROM jobs WHERE status != ?", (DONE,)
+        )
+        return {r["video_id"] for r in rows}
+
+    def active_count(self) -> int:
+        row = self._conn().execute(
+            "SELECT COUNT(*) AS n FROM jobs WHERE status IN (?, ?)", (QUEUED, LEASED)
+        ).fetchone()
+        return int(row["n"])
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        rows = self._conn().execute(
+            "SELECT stage, status, COUNT(*) AS n FROM jobs GROUP BY stage, status"
+        )
+        return {(r["stage"], r["status"]): int(r["n"]) for r in rows}
+
+    # ----------------------------
+    # WORKER SIDE
+    # ----------------------------
+    def claim(
+        self, owner: str, stages: Sequence[str] = STAGES, lease_s: float = LEASE_S
+    ) -> Optional[Lease]:
+        if not stages:
+            return None
+        now = time.time()
+        marks = ", ".join("?" for _ in stages)
+        # Later stages first, so work in flight finishes before new work starts
+        rank = " ".join(f"WHEN '{s}' THEN {i}" for i, s in enumerate(STAGES))
+
+        with self._tx() as conn:
+            # Rows out of attempts are failed on the way and the next one is
+            # tried, so a worker doesn't sit out a poll with work waiting
+            while True:
+                row = conn.execute(
+                    f"SELECT video_id, stage, attempts, payload FROM jobs"
+                    f" WHERE stage IN ({marks}) AND ("
+                    f"  (status = ? AND available_at <= ?)"
+                    f"  OR (status = ? AND lease_expires < ?))"
+                    f" ORDER BY CASE stage {rank} END DESC,"
+                    f" priority DESC, created_at"
+                    f" LIMIT 1",
+                    (*stages, QUEUED, now, LEASED, now),
+                ).fetchone()
+                if row is None:
+                    return None
+
+                attempts = int(row["attempts"]) + 1
+                if attempts <= MAX_ATTEMPTS:
+                    break
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = NULL,"
+                    " updated_at = ?, error = COALESCE(error, ?) WHERE video_id = ?",
+                    (FAILED, now, "lease expired too many times", row["video_id"]),
+                )
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?,"
+                " attempts = ?, updated_at = ? WHERE video_id = ?",
+                (LEASED, owner, now + lease_s, attempts, now, row["video_id"]),
+            )
+
+        return Lease(
+            video_id=row["video_id"],
+            stage=row["stage"],
+            attempts=attempts,
+            job=_load_job(row["video_id"], row["payload"]),
+        )
+
+    def _owned(
+        self,
+        conn: sqlite3.Connection,
+        sql: str,
+        params: Tuple[Any, ...],
+        lease: Lease,
+        owner: str,
+    ) -> None:
+        cur = conn.execute(
+            f"{sql} WHERE video_id = ? AND stage = ? AND status = ? AND lease_owner = ?",
+            (*params, lease.video_id, lease.stage, LEASED, owner),
+        )
+        if cur.rowcount != 1:
+            raise LeaseLost(f"{lease.video_id} [{lease.stage}] was reclaimed")
+
+    def heartbeat(self, lease: Lease, owner: str, lease_s: float = LEASE_S) -> bool:
+        now = time.time()
+        try:
+            with self._tx() as conn:
+                self._owned(
+                    conn,
+                    "UPDATE jobs SET lease_expires = ?, updated_at = ?",
+                    (now + lease_s, now),
+                    lease,
+                    owner,
+                )
+        except LeaseLost:
+            return False
+        return True
+
+    def advance(self, lease: Lease, owner: str) -> None:
+        # Stage done: hand the job to whoever claims the next stage
+        idx = STAGES.index(lease.stage)
+        now = time.time()
+        if idx + 1 < len(STAGES):
+            sql = (
+                "UPDATE jobs SET stage = ?, status = ?, payload = ?, attempts = 0,"
+                " lease_owner = NULL, lease_expires = NULL, available_at = 0,"
+                " updated_at = ?"
+            )
+            params: Tuple[Any, ...] = (
+                STAGES[idx + 1],
+                QUEUED,
+                _dump_job(lease.job),
+                now,
+            )
+        else:
+            sql = (
+                "UPDATE jobs SET status = ?, payload = ?, lease_owner = NULL,"
+                " lease_expires = NULL, updated_at = ?"
+            )
+            params = (DONE, _dump_job(lease.job), now)
+        with self._tx() as conn:
+            self._owned(conn, sql, params, lease, owner)
+
+    def fail(
+        self, lease: Lease, owner: str, error: str, skip: bool = False
+    ) -> bool:
+        # Returns True if the job is finished for good (skipped or out of tries)
+        now = time.time()
+        final = skip or lease.attempts >= MAX_ATTEMPTS
+        stage = lease.stage
+        if final:
+            status, available_at = (SKIPPED if skip else FAILED), 0.0
+        else:
+            status, available_at = QUEUED, now + RETRY_DELAY_S * lease.attempts
+            job = lease.job
+            if stage in ("analyze", "clip") and not (
+                job.video_path and Path(job.video_path).exists()
+            ):
+                # The cached source was evicted (or never made it to disk)
+                # while the row waited between leases: download again
+                stage = STAGES[0]
+        with self._tx() as conn:
+            self._owned(
+                conn,
+                "UPDATE jobs SET stage = ?, status = ?, error = ?, available_at = ?,"
+                " lease_owner = NULL, lease_expires = NULL, updated_at = ?",
+                (stage, status, error, available_at, now),
+                lease,
+                owner,
+            )
+        return final
+
+
+def fill_queue(
+    queue: JobQueue,
+    candidates: Iterator[Tuple[float, Candidate]],
+    buffer_target: int,
+) -> int:
+    # Queue enough top candidates that ready + in-flight reaches the target
+    need = buffer_target - ready_count() - queue.active_count()
+    if need <= 0:
+        print(f"📦 Upload buffer covered ({buffer_target} ready or in flight).")
+        return 0
+
+    known = queue.known_ids() | used_video_ids()
+    added = 0
+    for score, item in candidates:
+        if added >= need:
+            break
+        if candidate_id(item) in known:
+            continue
+        if queue.enqueue(item, priority=score):
+            print(f"🎯 Queued: {item.title}")
+            added += 1
+    if added < need:
+        print(f"⚠️ Only queued {added}/{need} (ran out of candidates).")
+    return added
+
+
+class QueueWorker:
+    # Claims jobs for `stages` and runs them; a background thread renews the
+    # lease while a stage is running.
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        stages: Sequence[str] = STAGES,
+        owner: Optional[str] = None,
+        lease_s: float = LEASE_S,
+        poll_s: float = 10.0,
+    ) -> None:
+        unknown = [s for s in stages if s not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown pipeline stage: {', '.join(unknown)}")
+        self.queue = queue
+        self.stages = list(stages)
+        self.owner = owner or worker_id()
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _keep_alive(self, lease: Lease, done: threading.Event) -> None:
+        # Renew at a third of the lease so one missed beat isn't fatal
+        while not done.wait(self.lease_s / 3):
+            if not self.queue.heartbeat(lease, self.owner, self.lease_s):
+                print(f"⚠️ [{self.owner}] lost lease on {lease.video_id}")
+                # The stage checks this before every write; the new owner's
+                # results are the ones that count
+                lease.job.cancelled.set()
+                return
+
+    def run_one(self) -> bool:
+        # False when there was nothing to claim
+        lease = self.queue.claim(self.owner, self.stages, self.lease_s)
+        if lease is None:
+            return False
+
+        print(f"🔧 [{self.owner}] {lease.stage} {lease.video_id}")
+        done = threading.Event()
+        beat = threading.Thread(
+            target=self._keep_alive, args=(lease, done), daemon=True
+        )
+        beat.start()
+        try:
+            run_stage(lease.stage, lease.job)
+        except Exception as e:
+            done.set()
+            beat.join()
+            if isinstance(e, Cancelled):
+                print(f"⚠️ [{lease.stage}] {lease.video_id}: lease lost, dropped")
+                return True
+            if isinstance(e, Skip):
+                print(f"⏭ [{lease.stage}] {lease.video_id}: {e}")
+            else:
+                print(f"❌ [{lease.stage}] {lease.video_id} failed: {e}")
+            try:
+                if self.queue.fail(lease, self.owner, str(e), skip=isinstance(e, Skip)):
+                    # Don't leave multi-GB sources behind for dropped jobs
+                    abandon(lease.video_id)
+            except LeaseLost as lost:
+                print("⚠️", lost)
+            return True
+
+        done.set()
+        beat.join()
+        if lease.job.cancelled.is_set():
+            print(f"⚠️ [{lease.stage}] {lease.video_id}: lease lost, dropped")
+            return True
+        try:
+            self.queue.advance(lease, self.owner)
+        except LeaseLost as lost:
+            # Someone else is redoing this stage; their result wins
+            print("⚠️", lost)
+        return True
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                worked = self.run_one()
+            except Exception as e:
+                print(f"❌ [{self.owner}] queue error:", e)
+                worked = False
+            if not worked:
+                self._stop.wait(self.poll_s)
+
+
+def start_workers(
+    queue: JobQueue, stages: Sequence[str] = STAGES, count: int = 1
+) -> List[QueueWorker]:
+    workers = [
+        QueueWorker(queue, stages, owner=worker_id(n)) for n in range(max(0, count))
+    ]
+    for w in workers:
+        threading.Thread(target=w.run_forever, name=w.owner, daemon=True).start()
+    return workers
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import heapq
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from engine.utils.registry import get_job_last_run, set_job_last_run
+
+
+MAX_SLEEP_S = 300  # wake up at least this often to pick up clock changes
+
+
+def parse_window(spec: str) -> Optional[Tuple[int, int]]:
+    # "1-6" -> (1, 6): local hours [1:00, 6:00). Wraps past midnight ("22-4").
+    spec = spec.strip()
+    if not spec:
+        return None
+    start, end = (int(x) for x in spec.split("-", 1))
+    if not (0 <= start < 24 and 0 <= end <= 24) or start == end:
+        raise ValueError(f"Bad time window: {spec}")
+    return start, end
+
+
+def _in_window(dt: datetime, window: Tuple[int, int]) -> bool:
+    start, end = window
+    if start < end:
+        return start <= dt.hour < end
+    return dt.hour >= start or dt.hour < end
+
+
+def _next_window_start(ts: float, window: Tuple[int, int]) -> float:
+    dt = datetime.fromtimestamp(ts).astimezone()
+    if _in_window(dt, window):
+        return ts
+    start_dt = dt.replace(hour=window[0], minute=0, second=0, microsecond=0)
+    if start_dt <= dt:
+        start_dt += timedelta(days=1)
+    return start_dt.timestamp()
+
+
+def _parse_iso(ts: str) -> datetime:
+    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    interval_s: float
+    fn: Callable[[], None]
+    jitter_s: float = 0.0
+    window: Optional[Tuple[int, int]] = None  # local hours the job may start in
+
+    def next_slot(self, last_slot: Optional[float], now: float) -> float:
+        # Slots sit on a fixed grid (last slot + k * interval), so run time
+        # and jitter never push the cadence later. After downtime the
+        # latest missed slot runs once, the rest are skipped.
+        if last_slot is None:
+            return now
+        slot = last_slot + self.interval_s
+        if slot < now:
+            slot += (now - slot) // self.interval_s * self.interval_s
+        return slot
+
+    def due(self, slot: float) -> float:
+        # Jitter is per run, on top of the slot; it doesn't carry over
+        due = slot + random.uniform(0, self.jitter_s)
+        if self.window is not None:
+            due = _next_window_start(due, self.window)
+        return due
+
+
+def format_remaining(seconds: int) -> str:
+    h = seconds // 3600
+    m = (seconds % 3600) // 60
+    s = seconds % 60
+    return f"{h:02d}h {m:02d}m {s:02d}s"
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class DeadlineScheduler:
+    # Sleeps until the earliest due job instead of polling. Each job keeps
+    # its own cadence and runs on its own thread, so a production run that
+    # takes hours never holds up an upload. The registry keeps each job's
+    # last slot so a restart picks up where it left off.
+
+    def __init__(self, jobs: List[ScheduledJob]) -> None:
+        self.jobs = jobs
+        self._heap: List[Tuple[float, int, float, ScheduledJob]] = []
+        self._running: Dict[str, threading.Thread] = {}
+        now = time.time()
+        for i, job in enumerate(jobs):
+            last = get_job_last_run(job.name)
+            last_ts = _parse_iso(last).timestamp() if last else None
+            slot = job.next_slot(last_ts, now)
+            heapq.heappush(self._heap, (job.due(slot), i, slot, job))
+
+    def _run(self, job: ScheduledJob) -> None:
+        print(f"\n▶️ Running job: {job.name}")
+        try:
+            job.fn()
+        except Exception as e:
+            print(f"❌ Job {job.name} failed:", e)
+
+    def run_pending(self) -> float:
+        # Start everything that's due; returns the next deadline
+        while self._heap and self._heap[0][0] <= time.time():
+            _, i, slot, job = heapq.heappop(self._heap)
+
+            # Record the slot first so a crashing job can't hot-loop
+            set_job_last_run(job.name, _iso(slot))
+            running = self._running.get(job.name)
+            if running is not None and running.is_alive():
+                print(f"⏭ Job {job.name} still running, skipping this slot.")
+            else:
+                t = threading.Thread(
+                    target=self._run, args=(job,), name=f"job-{job.name}", daemon=True
+                )
+                self._running[job.name] = t
+                t.start()
+
+            nxt = job.next_slot(slot, time.time())
+            heapq.heappush(self._heap, (job.due(nxt), i, nxt, job))
+        return self._heap[0][0] if self._heap else float("inf")
+
+    def run_forever(self) -> None:
+        while True:
+            next_at = self.run_pending()
+            _, _, _, job = self._heap[0]
+            wait = max(0.0, next_at - time.time())
+
+            due_local = datetime.fromtimestamp(next_at, timezone.utc).astimezone()
+            print(
+                f"⏳ Next: {job.name} in {format_remaining(int(wait))}"
+                f" (at {due_local:%Y-%m-%d %H:%M})"
+            )
+            # Re-check periodically rather than trusting one long sleep
+            while wait > 0:
+                time.sleep(min(wait, MAX_SLEEP_S))
+                wait = next_at - time.time()
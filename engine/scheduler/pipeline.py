@@ -0,0 +1,477 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from engine.utils.artifacts import SCRATCH_DIR, sweep_stale
+from engine.utils.artifacts import store as artifacts
+from engine.utils.metrics import add, file_size, measure
+from engine.utils.registry import (
+    is_clip_used,
+    set_clip_key,
+    set_exhausted,
+    upsert_processed,
+    pending_uploads,
+    get_clip,
+    set_checkpoint,
+    get_checkpoints,
+    clear_checkpoints,
+    resumable_ids,
+    transaction,
+)
+from engine.video.downloader import (
+    DOWNLOAD_DIR,
+    download_proxy,
+    download_section,
+    download_video,
+)
+from engine.video.moment_detector import find_best_moments
+from engine.video.clipper import extract_clip
+from engine.editing.renderer import render_shorts
+from engine.scoring.ranker import Candidate, candidate_from_dict, candidate_id
+
+
+STAGES = ("download", "analyze", "clip", "render")
+
+
+def parse_workers(spec: str) -> Dict[str, int]:
+    # "download=2,render=1" -> {"download": 2, "render": 1}
+    out: Dict[str, int] = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        name, n = part.split("=", 1)
+        name = name.strip()
+        if name not in STAGES:
+            raise ValueError(f"Unknown pipeline stage: {name}")
+        out[name] = max(1, int(n))
+    return out
+
+
+@dataclass
+class Job:
+    item: Candidate
+    video_id: str
+    video_path: Optional[Path] = None
+    start: float = 0.0
+    end: float = 0.0
+    clip_path: Optional[Path] = None
+    final_path: Optional[Path] = None
+    # Set when whoever runs the job loses it (queue lease taken over); the
+    # stage then stops before writing anything
+    cancelled: threading.Event = field(
+        default_factory=threading.Event, repr=False, compare=False
+    )
+
+
+@dataclass
+class StageStats:
+    done: int = 0
+    failed: int = 0
+    busy_s: float = 0.0
+    max_depth: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, ok: bool, seconds: float) -> None:
+        with self.lock:
+            if ok:
+                self.done += 1
+            else:
+                self.failed += 1
+            self.busy_s += seconds
+
+
+class Skip(Exception):
+    # Not an error, the job just shouldn't continue (e.g. clip already used)
+    pass
+
+
+class Cancelled(Exception):
+    # The job was taken away mid-stage; its new owner writes the results
+    pass
+
+
+def _check(job: Job) -> None:
+    if job.cancelled.is_set():
+        raise Cancelled(f"{job.video_id}: job was cancelled")
+
+
+# ----------------------------
+# STAGES
+# ----------------------------
+# Bump a stage's version when its output changes; old artifacts stop matching
+STAGE_VERSIONS = {"download": 1, "analyze": 2, "clip": 1, "render": 1}
+MAX_RESUMES = 3  # a video that keeps failing is dropped after this many starts
+CLIP_LEN = 45
+# Moments kept per analysis; a source that comes round again gets its next
+# best unused one instead of a skip
+MOMENTS_PER_SOURCE = int(os.getenv("MOMENTS_PER_SOURCE", "3"))
+# "full": download the whole source at best quality, analyze and cut it.
+# "proxy": analyze a low-bitrate proxy, then download only the chosen
+# section at best quality (a small fraction of the bytes on long VODs).
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "full").strip().lower()
+
+
+def _reuse(job: Job, stage: str, params: Dict[str, object]) -> Optional[Path]:
+    found = artifacts.get(stage, job.video_id, params, STAGE_VERSIONS[stage])
+    if found is not None:
+        print(f"♻️ [{stage}] {job.video_id}: reusing {found}")
+    return found
+
+
+def _store(job: Job, stage: str, params: Dict[str, object], src: Path) -> Path:
+    _check(job)
+    out = artifacts.put(src, stage, job.video_id, params, STAGE_VERSIONS[stage])
+    set_checkpoint(job.video_id, stage, {"path": str(out)})
+    return out
+
+
+def _not_uploaded(job: Job) -> None:
+    c = get_clip(job.video_id, job.start, job.end)
+    if c and c.get("uploaded"):
+        raise Skip("already uploaded")
+
+
+def _past_clip(job: Job) -> bool:
+    # Resumed after the clip was cut: the source may be evicted by now and
+    # isn't needed
+    return job.clip_path is not None and job.clip_path.exists()
+
+
+def download_stage(job: Job) -> None:
+    if _past_clip(job):
+        return
+    proxy = DOWNLOAD_MODE == "proxy"
+    params = {"url": job.item.url, "mode": DOWNLOAD_MODE}
+    found = _reuse(job, "download", params)
+    if found is None:
+        with measure("download_proxy" if proxy else "download_video"):
+            fetch = download_proxy if proxy else download_video
+            raw = fetch(job.item.url, job.video_id)
+            add(nbytes=file_size(raw))
+        found = _store(job, "download", params, raw)
+    job.video_path = found
+
+
+def analyze_stage(job: Job) -> None:
+    if _past_clip(job):
+        return
+    assert job.video_path is not None
+    params = {"clip_len": CLIP_LEN, "k": MOMENTS_PER_SOURCE}
+    version = STAGE_VERSIONS["analyze"]
+    found = artifacts.get_json("analyze", job.video_id, params, version)
+    if found is not None:
+        moments = found["moments"]
+        print(f"♻️ [analyze] {job.video_id}: reusing {len(moments)} moment(s)")
+    else:
+        moments = [
+            {"start": float(start), "end": float(end)}
+            for start, end in find_best_moments(
+                job.video_path,
+                k=MOMENTS_PER_SOURCE,
+                clip_len=CLIP_LEN,
+                source_id=job.video_id,
+            )
+        ]
+        _check(job)
+        artifacts.put_json(
+            {"moments": moments}, "analyze", job.video_id, params, version
+        )
+
+    # Best moment whose clip hasn't been produced already
+    unused = [
+        m for m in moments if not is_clip_used(job.video_id, m["start"], m["end"])
+    ]
+    if not unused:
+        # Out of the candidate pool from now on
+        _check(job)
+        set_exhausted(job.video_id)
+        raise Skip("every moment already produced")
+    moment = unused[0]
+    job.start, job.end = moment["start"], moment["end"]
+    _check(job)
+    set_checkpoint(job.video_id, "analyze", moment)
+
+
+def clip_stage(job: Job) -> None:
+    _not_uploaded(job)
+    params = {"start": job.start, "end": job.end}
+    found = _reuse(job, "clip", params)
+    if found is None:
+        assert job.video_path is not None
+        if is_clip_used(job.video_id, job.start, job.end):
+            raise Skip("clip identity already used")
+        _check(job)
+        set_clip_key(job.video_id, job.start, job.end)
+        if DOWNLOAD_MODE == "proxy":
+            # The video we analyzed is the proxy; fetch the real pixels now
+            with measure("download_section"):
+                clip = download_section(
+                    job.item.url, job.video_id, job.start, job.end
+                )
+                add(nbytes=file_size(clip))
+        else:
+            with measure("extract_clip"):
+                clip = extract_clip(job.video_path, job.start, job.end, job.video_id)
+                add(nbytes=file_size(clip))
+        found = _store(job, "clip", params, clip)
+    # The source stays in the media cache (another moment, a re-render after
+    # a crash); the store evicts it by LRU once it's over quota
+    job.clip_path = found
+
+
+def render_stage(job: Job) -> None:
+    assert job.clip_path is not None
+    _not_uploaded(job)
+    params = {"start": job.start, "end": job.end}
+    found = _reuse(job, "render", params)
+    if found is None:
+        found = _store(job, "render", params, render_shorts(job.clip_path))
+    job.final_path = found
+
+    title = f"{job.item.title} #shorts"
+    description = (
+        f"{job.item.title}\n\nSource: {job.item.url}"
+        f"\nCreator: {job.item.creator_label}"
+    )
+    # Landing in the registry with a final_path is what puts it in the buffer.
+    # One unit with dropping the checkpoints: a crash can't leave a rendered
+    # short that still looks resumable.
+    _check(job)
+    with transaction():
+        upsert_processed(
+            video_id=job.video_id,
+            creator=job.item.creator_label,
+            title=title,
+            description=description,
+            clip_start=job.start,
+            clip_end=job.end,
+            final_path=str(job.final_path),
+        )
+        clear_checkpoints(job.video_id)
+
+
+def start_job(item: Candidate) -> Job:
+    # Checkpoint the selection itself so a crashed cycle knows what to resume,
+    # and pick the job up from whatever earlier attempts completed.
+    vid = candidate_id(item)
+    cps = get_checkpoints(vid)
+    attempts = cps.get("selected", {}).get("attempts", 0) + 1
+    set_checkpoint(vid, "selected", {"item": asdict(item), "attempts": attempts})
+
+    # Pinned until finish_job(): nothing evicts the source between stages
+    artifacts.pin(vid)
+    job = Job(item=item, video_id=vid)
+    if "analyze" in cps:
+        job.start, job.end = cps["analyze"]["start"], cps["analyze"]["end"]
+    for stage, attr in (("download", "video_path"), ("clip", "clip_path")):
+        path = cps.get(stage, {}).get("path")
+        if path and Path(path).exists():
+            setattr(job, attr, Path(path))
+    return job
+
+
+def finish_job(job: Job) -> None:
+    # The job left the pipeline (rendered, skipped or failed): its source and
+    # clip are ordinary cache entries again
+    artifacts.unpin(job.video_id)
+
+
+def abandon(video_id: str) -> None:
+    # Give up on a video. Its downloads/clips stay in the media cache until
+    # evicted, so only the checkpoints go.
+    clear_checkpoints(video_id)
+
+
+def sweep_media() -> None:
+    # Startup housekeeping: leftovers of crashed runs in scratch and the
+    # download staging dir, then bring the cache back under quota
+    freed = sweep_stale(SCRATCH_DIR) + sweep_stale(DOWNLOAD_DIR)
+    if freed:
+        print(f"🧹 Removed {freed / 1024**2:.0f} MB of stale temp files")
+    artifacts.make_room()
+
+
+def iter_resumable() -> Iterator[Tuple[float, Candidate]]:
+    # Half-produced videos from earlier cycles, ahead of any new candidate
+    for vid in resumable_ids():
+        selected = get_checkpoints(vid).get("selected")
+        if not selected:
+            continue
+        if selected.get("attempts", 0) >= MAX_RESUMES:
+            print(f"⚠️ Giving up on {vid} after {selected['attempts']} attempts.")
+            abandon(vid)
+            continue
+        yield float("inf"), candidate_from_dict(selected["item"])
+
+
+def ready_count() -> int:
+    # Finished shorts waiting in the upload buffer
+    return sum(1 for v in pending_uploads() if Path(v["final_path"]).exists())
+
+
+STAGE_FNS: Dict[str, Callable[[Job], None]] = {
+    "download": download_stage,
+    "analyze": analyze_stage,
+    "clip": clip_stage,
+    "render": render_stage,
+}
+
+
+def run_stage(name: str, job: Job) -> None:
+    # Pinned while in flight so no other worker's eviction pulls the source
+    # or clip out from under this stage. Queue workers only hold a job for
+    # one stage; between leases an evicted download just rewinds the row.
+    with artifacts.pinned(job.video_id), measure(name, job.video_id):
+        STAGE_FNS[name](job)
+
+
+class ProductionPipeline:
+    # download -> analyze -> clip -> render, each stage with its own worker
+    # threads and a bounded queue in front of it. fill() keeps producing
+    # until `buffer_target` finished shorts are waiting for upload, so the
+    # upload tick itself never waits on production.
+
+    def __init__(
+        self,
+        workers: Optional[Dict[str, int]] = None,
+        queue_size: int = 2,
+        buffer_target: int = 3,
+    ) -> None:
+        self.workers = {name: 1 for name in STAGES}
+        self.workers.update(workers or {})
+        self.queue_size = max(1, queue_size)
+        self.buffer_target = max(1, buffer_target)
+
+        self.stats: Dict[str, StageStats] = {name: StageStats() for name in STAGES}
+        self._queues: Dict[str, "queue.Queue[Optional[Job]]"] = {}
+        self._results: "queue.Queue[bool]" = queue.Queue()
+
+    # ----------------------------
+    # WORKERS
+    # ----------------------------
+    def _worker(self, idx: int) -> None:
+        name = STAGES[idx]
+        q_in = self._queues[name]
+        q_out = self._queues[STAGES[idx + 1]] if idx + 1 < len(STAGES) else None
+        stats = self.stats[name]
+
+        while True:
+            job = q_in.get()
+            if job is None:
+                return
+
+            t0 = time.perf_counter()
+            try:
+                run_stage(name, job)
+            except Exception as e:
+                stats.add(False, time.perf_counter() - t0)
+                if isinstance(e, Skip):
+                    print(f"⏭ [{name}] {job.video_id}: {e}")
+                    abandon(job.video_id)
+                else:
+                    # Checkpoints and artifacts stay for the next cycle
+                    print(f"❌ [{name}] {job.video_id} failed: {e}")
+                finish_job(job)
+                self._results.put(False)
+                continue
+            stats.add(True, time.perf_counter() - t0)
+
+            if q_out is None:
+                finish_job(job)
+                self._results.put(True)
+            else:
+                q_out.put(job)
+                depth = q_out.qsize()
+                next_stats = self.stats[STAGES[idx + 1]]
+                with next_stats.lock:
+                    next_stats.max_depth = max(next_stats.max_depth, depth)
+
+    def ready_count(self) -> int:
+        return ready_count()
+
+    def fill(self, candidates: Iterator[Tuple[float, Candidate]]) -> int:
+        need = self.buffer_target - self.ready_count()
+        if need <= 0:
+            print(f"📦 Upload buffer full ({self.buffer_target} ready).")
+            return 0
+
+        print(f"🏭 Producing {need} short(s) to fill the upload buffer...")
+        # Per-fill numbers: report() divides them by this fill's wall time
+        self.stats = {name: StageStats() for name in STAGES}
+        self._queues = {name: queue.Queue(maxsize=self.queue_size) for name in STAGES}
+        self._results = queue.Queue()
+
+        threads: List[List[threading.Thread]] = []
+        for idx, name in enumerate(STAGES):
+            stage_threads = [
+                threading.Thread(
+                    target=self._worker, args=(idx,), name=f"{name}-{n}", daemon=True
+                )
+                for n in range(self.workers[name])
+            ]
+            for t in stage_threads:
+                t.start()
+            threads.append(stage_threads)
+
+        produced = 0
+        in_flight = 0
+        claimed: Set[str] = set()
+        exhausted = False
+        t0 = time.perf_counter()
+
+        try:
+            while produced < need:
+                # Keep exactly enough jobs in flight; a failure frees a slot
+                while not exhausted and in_flight < need - produced:
+                    nxt = next(candidates, None)
+                    if nxt is None:
+                        exhausted = True
+                        break
+                    item = nxt[1]
+                    vid = candidate_id(item)
+                    if vid in claimed:
+                        continue
+                    claimed.add(vid)
+                    print(f"🎯 Queued: {item.title}")
+                    first = self._queues[STAGES[0]]
+                    first.put(start_job(item))
+                    in_flight += 1
+                    st = self.stats[STAGES[0]]
+                    with st.lock:
+                        st.max_depth = max(st.max_depth, first.qsize())
+
+                if in_flight == 0:
+                    break
+
+                ok = self._results.get()
+                in_flight -= 1
+                produced += int(ok)
+        finally:
+            # Stages drain in order, so each sees its sentinels after real work
+            for name, stage_threads in zip(STAGES, threads):
+                for _ in stage_threads:
+                    self._queues[name].put(None)
+                for t in stage_threads:
+                    t.join()
+
+        self.report(time.perf_counter() - t0)
+        if produced < need:
+            print(f"⚠️ Only produced {produced}/{need} (ran out of candidates).")
+        return produced
+
+    def report(self, wall_s: float) -> None:
+        for name in STAGES:
+            st = self.stats[name]
+            rate = st.done / wall_s * 3600 if wall_s > 0 else 0.0
+            print(
+                f"📈 {name:<8} ok {st.done:>3} | failed {st.failed:>3}"
+                f" | busy {st.busy_s:7.1f}s | {rate:6.1f}/h"
+                f" | max queue {st.max_depth}"
+            )
+
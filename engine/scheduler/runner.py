@@ -1,174 +1,255 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone, timedelta
+from functools import partial
 from pathlib import Path
-import time
+from itertools import chain
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import os
+import threading
 
 from engine.utils.registry import (
     get_last_cycle_at,
     set_last_cycle_at,
     mark_uploaded,
-    upsert_processed,
-    is_video_used,
-    is_clip_used,
-    set_clip_key,
+    used_video_ids,
+    pending_uploads,
+    get_clip,
+    get_job_last_run,
+    set_job_last_run,
 )
+from engine.utils.metrics import add, begin_cycle, file_size, measure
 from engine.youtube.uploader import upload_short
 
-from engine.video.downloader import download_video
-from engine.video.moment_detector import find_best_moment
-from engine.video.clipper import extract_clip
-from engine.editing.renderer import render_shorts
-
-from engine.discovery.discovery import DiscoveryService, load_creators
-from engine.discovery.youtube_fetcher import YouTubeVideo
-from engine.scoring.ranker import rank_candidates
-
-
-def format_remaining(seconds: int) -> str:
-    h = seconds // 3600
-    m = (seconds % 3600) // 60
-    s = seconds % 60
-    return f"{h:02d}h {m:02d}m {s:02d}s"
-
-
-def seconds_until_next_run(interval_hours: int) -> int:
-    last = get_last_cycle_at()
-    if not last:
-        return 0
-
-    last_dt = _parse_iso(last)
-    next_dt = last_dt + timedelta(hours=interval_hours)
-    remaining = (next_dt - datetime.now(timezone.utc)).total_seconds()
-    return max(0, int(remaining))
-
-
-def _parse_iso(ts: str) -> datetime:
-    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
-
-
-def should_run(interval_hours: int) -> bool:
-    last = get_last_cycle_at()
-    if not last:
-        return True
-    last_dt = _parse_iso(last)
-    return datetime.now(timezone.utc) - last_dt >= timedelta(hours=interval_hours)
+from engine.discovery.discovery import DiscoveryService, DiscoveryItem, load_creators
+from engine.scoring.ranker import Candidate, iter_top_candidates
+from engine.scheduler.pipeline import (
+    STAGES,
+    ProductionPipeline,
+    Skip,
+    abandon,
+    finish_job,
+    iter_resumable,
+    parse_workers,
+    run_stage,
+    start_job,
+    sweep_media,
+)
+from engine.scheduler.job_queue import JobQueue, fill_queue, start_workers
+from engine.scheduler.jobs import (
+    DeadlineScheduler,
+    ScheduledJob,
+    format_remaining,
+    parse_window,
+)
 
 
-def run_once(
-    discovery: DiscoveryService, creators_path: str, privacy: str = "public"
-) -> None:
+def discover_candidates(
+    discovery: DiscoveryService, creators_path: str
+) -> List[DiscoveryItem]:
     creators = load_creators(creators_path)
     results = discovery.fetch_all(creators)
 
-    all_items = []
+    all_items: List[DiscoveryItem] = []
     for items in results.values():
         all_items.extend(items)
+    return all_items
 
-    if not all_items:
-        print("No candidates discovered.")
-        return
-
-    ranked = rank_candidates(all_items)
 
-    # Pick first unused source video (never repeat)
-    selected = None
-    for score, item in ranked:
-        video_id = item.video_id if isinstance(item, YouTubeVideo) else item.vod_id
-        if not is_video_used(video_id):
-            selected = (item, video_id)
-            break
+def _cycle_candidates(
+    discovery: DiscoveryService, creators_path: str
+) -> Iterator[Tuple[str, Candidate]]:
+    # Crashed cycles' half-produced videos go first; discovery only runs once
+    # there's nothing left to resume
+    for _, item in iter_resumable():
+        yield "♻️ Resuming", item
 
-    if not selected:
-        print("No new viral videos available.")
+    all_items = discover_candidates(discovery, creators_path)
+    if not all_items:
+        print("No candidates discovered.")
         return
 
-    top_item, video_id = selected
-    print(f"\n🎯 Selected: {top_item.title}")
+    # Best sources that still have an unused moment
+    for _, item in iter_top_candidates(all_items, exclude=used_video_ids()):
+        yield "🎯 Selected", item
 
-    # Download
-    video_path = download_video(top_item.url, video_id)
 
-    # Moment detect
-    start, end = find_best_moment(video_path)
-
-    # Clip identity (no file hashing)
-    if is_clip_used(video_id, start, end):
-        print("Clip identity already used, skipping.")
+def run_once(
+    discovery: DiscoveryService, creators_path: str, privacy: str = "public"
+) -> None:
+    begin_cycle()
+    for label, item in _cycle_candidates(discovery, creators_path):
+        print(f"\n{label}: {item.title}")
+
+        # download -> analyze -> clip -> render, each checkpointed; a stage
+        # whose artifact already exists is skipped. Errors keep the
+        # checkpoints so the next cycle resumes here; a skip moves on to the
+        # next candidate.
+        job = start_job(item)
+        try:
+            for name in STAGES:
+                run_stage(name, job)
+        except Skip as e:
+            print(f"⏭ {job.video_id}: {e}")
+            abandon(job.video_id)
+            continue
+        finally:
+            finish_job(job)
+
+        v = get_clip(job.video_id, job.start, job.end)
+        if v is not None:
+            _upload(v, privacy)
         return
-    set_clip_key(video_id, start, end)
 
-    # Extract clip
-    clip_path = extract_clip(video_path, start, end, video_id)
+    print("No new viral videos available.")
 
-    # Render shorts (your renderer cleans up intermediates)
-    final_path = render_shorts(clip_path)
 
-    # Save metadata to registry BEFORE deleting source
-    # (description can be improved later, keep it simple now)
-    title = f"{top_item.title} #shorts"
-    description = (
-        f"{top_item.title}\n\nSource: {top_item.url}\nCreator: {top_item.creator_label}"
-    )
-    upsert_processed(
-        video_id=video_id,
-        creator=top_item.creator_label,
-        title=title,
-        description=description,
-        clip_start=start,
-        clip_end=end,
-        final_path=str(final_path),
-    )
-
-    # Optional: delete downloaded source to save space
-    print("🗑 Removing source video...")
-    try:
-        if Path(video_path).exists():
-            Path(video_path).unlink()
-    except Exception as e:
-        print("⚠️ Could not delete source video:", e)
-
-    # Upload
-    yt_id = upload_short(
-        video_path=Path(final_path),
-        title=title,
-        description=description,
-        privacy=privacy,
-    )
+def _upload(v: Dict[str, Any], privacy: str) -> None:
+    final_path = Path(v["final_path"])
+    with measure("upload_short", v["video_id"]):
+        yt_id = upload_short(
+            video_path=final_path,
+            title=v["title"],
+            description=v["description"],
+            privacy=privacy,
+        )
+        add(nbytes=file_size(final_path))
 
     # Mark uploaded only AFTER success
-    mark_uploaded(video_id, yt_id)
+    mark_uploaded(v["video_id"], yt_id, v["clip_start"], v["clip_end"])
 
     # Optional: delete final after upload (if you ever want this)
     if os.getenv("DELETE_FINAL_AFTER_UPLOAD", "0") == "1":
         try:
-            Path(final_path).unlink()
+            final_path.unlink()
             print("🧹 Deleted final after upload.")
         except Exception as e:
             print("⚠️ Could not delete final:", e)
 
 
+def upload_next(privacy: str = "public") -> bool:
+    # Upload the oldest finished short from the buffer
+    for v in pending_uploads():
+        if Path(v["final_path"]).exists():
+            _upload(v, privacy)
+            return True
+    return False
+
+
+def _candidates(all_items: List[DiscoveryItem]) -> Iterator[Tuple[float, Candidate]]:
+    # Unfinished work from crashed cycles first, then the best new sources
+    return chain(
+        iter_resumable(), iter_top_candidates(all_items, exclude=used_video_ids())
+    )
+
+
+def _env_minutes(name: str, default: str) -> float:
+    return float(os.getenv(name, default)) * 60
+
+
+def build_jobs(
+    discovery: DiscoveryService,
+    creators_path: str,
+    fill: Optional[Callable[[Iterator[Tuple[float, Candidate]]], int]],
+    interval_hours: float,
+    privacy: str = "public",
+) -> List[ScheduledJob]:
+    jitter_s = float(os.getenv("JOB_JITTER_MINUTES", "5")) * 60
+
+    if fill is None:
+        # PIPELINE_BUFFER=0: the old one-video-per-cycle run_once
+        def cycle() -> None:
+            set_last_cycle_at()
+            # No transaction() around the cycle: uploads and checkpoints
+            # have to reach disk the moment they happen
+            run_once(discovery, creators_path, privacy=privacy)
+
+        return [ScheduledJob("cycle", interval_hours * 3600, cycle, jitter_s)]
+
+    # Latest discovery result, shared between the discovery and production
+    # jobs. Jobs run on their own threads; the lock keeps production from
+    # starting a second discovery while one is already filling this in.
+    latest: Dict[str, List[DiscoveryItem]] = {"items": []}
+    latest_lock = threading.RLock()
+
+    def discover() -> None:
+        with latest_lock:
+            latest["items"] = discover_candidates(discovery, creators_path)
+            print(f"🔎 Discovered {len(latest['items'])} candidates.")
+
+    def refresh_stats() -> None:
+        discovery.refresh_stats()
+
+    def produce() -> None:
+        begin_cycle()
+        with latest_lock:
+            if not latest["items"]:
+                discover()
+            items = latest["items"]
+        if not items:
+            print("No candidates discovered.")
+        fill(_candidates(items))
+
+    def upload() -> None:
+        set_last_cycle_at()
+        if not upload_next(privacy):
+            print("📭 Upload buffer empty, nothing to upload.")
+
+    return [
+        ScheduledJob(
+            "discovery", _env_minutes("DISCOVERY_INTERVAL_MINUTES", "60"), discover, jitter_s
+        ),
+        ScheduledJob(
+            "stats_refresh",
+            _env_minutes("STATS_REFRESH_INTERVAL_MINUTES", "15"),
+            refresh_stats,
+            jitter_s,
+        ),
+        ScheduledJob(
+            "production",
+            _env_minutes("PRODUCTION_INTERVAL_MINUTES", "120"),
+            produce,
+            jitter_s,
+            window=parse_window(os.getenv("PRODUCTION_WINDOW", "")),
+        ),
+        ScheduledJob("upload", interval_hours * 3600, upload, jitter_s),
+    ]
+
+
 def run_forever(discovery: DiscoveryService, creators_path: str) -> None:
-    interval_hours = int(os.getenv("UPLOAD_INTERVAL_HOURS", "8"))
+    interval_hours = float(os.getenv("UPLOAD_INTERVAL_HOURS", "8"))
     privacy = os.getenv("YOUTUBE_PRIVACY", "public")
+    sweep_media()
+
+    buffer_target = int(os.getenv("PIPELINE_BUFFER", "0"))
+    fill: Optional[Callable[[Iterator[Tuple[float, Candidate]]], int]] = None
+    if buffer_target > 0 and os.getenv("JOB_QUEUE", "0") == "1":
+        # Shared queue: any number of run_worker.py processes do the work
+        queue = JobQueue()
+        fill = partial(fill_queue, queue, buffer_target=buffer_target)
+        local = int(os.getenv("LOCAL_WORKERS", "0"))
+        if local > 0:
+            start_workers(queue, STAGES, local)
+            print(f"🔧 Started {local} local queue worker(s)")
+    elif buffer_target > 0:
+        pipeline = ProductionPipeline(
+            workers=parse_workers(os.getenv("PIPELINE_WORKERS", "")),
+            queue_size=int(os.getenv("PIPELINE_QUEUE_SIZE", "2")),
+            buffer_target=buffer_target,
+        )
+        fill = pipeline.fill
+
+    jobs = build_jobs(discovery, creators_path, fill, interval_hours, privacy)
+
+    # Upgrading from the polling loop: keep the upload cadence where it was
+    last_cycle = get_last_cycle_at()
+    for job in jobs:
+        if job.name in ("cycle", "upload") and last_cycle:
+            if not get_job_last_run(job.name):
+                set_job_last_run(job.name, last_cycle)
 
     print(f"⏱ Scheduler started. Interval: {interval_hours}h | Privacy: {privacy}")
+    for job in jobs:
+        window = f" | window {job.window[0]}-{job.window[1]}h" if job.window else ""
+        print(f"   • {job.name}: every {format_remaining(int(job.interval_s))}{window}")
 
-    while True:
-        if should_run(interval_hours):
-            print("\n🚀 Time to run a new upload cycle!")
-            set_last_cycle_at()
-            try:
-                run_once(discovery, creators_path, privacy=privacy)
-            except Exception as e:
-                print("❌ Cycle failed:", e)
-        else:
-            remaining = seconds_until_next_run(interval_hours)
-            print(
-                f"\r⏳ Next upload in: {format_remaining(remaining)}",
-                end="",
-                flush=True,
-            )
-
-        time.sleep(5)  # update countdown every 5 seconds
+    DeadlineScheduler(jobs).run_forever()
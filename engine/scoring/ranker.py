@@ -1,25 +1,139 @@
-from typing import List, Tuple, Union
+from datetime import datetime, timezone
+from itertools import chain
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
 
 from engine.discovery.youtube_fetcher import YouTubeVideo
 from engine.discovery.twitch_fetcher import TwitchVOD
-from .virality_score import score_youtube, score_twitch
 
 
 Candidate = Union[YouTubeVideo, TwitchVOD]
 
+TOPK_START = 64  # first lazy top-k window; grows 4x when exhausted
 
-def rank_candidates(all_items: List[Candidate]) -> List[Tuple[float, Candidate]]:
-    scored: List[Tuple[float, Candidate]] = []
 
-    for item in all_items:
-        if isinstance(item, YouTubeVideo):
-            score = score_youtube(item)
-        elif isinstance(item, TwitchVOD):
-            score = score_twitch(item)
+def candidate_id(item: Candidate) -> str:
+    return item.video_id if isinstance(item, YouTubeVideo) else item.vod_id
+
+
+def candidate_from_dict(d: Dict[str, Any]) -> Candidate:
+    # Inverse of dataclasses.asdict for stored candidates
+    if d.get("platform") == "youtube":
+        return YouTubeVideo(**d)
+    return TwitchVOD(**d)
+
+
+def _epoch_hours(values: Sequence[str]) -> np.ndarray:
+    # Both APIs return UTC "YYYY-MM-DDTHH:MM:SSZ". Parse the fixed-width
+    # digits for all items at once instead of one fromisoformat per item.
+    raw = np.array([v[:19] if len(v) >= 19 else "" for v in values], dtype="S19")
+    ok = np.char.str_len(raw) == 19
+    d = raw.view(np.uint8).reshape(-1, 19).astype(np.int64) - ord("0")
+
+    y = d[:, 0] * 1000 + d[:, 1] * 100 + d[:, 2] * 10 + d[:, 3]
+    m = d[:, 5] * 10 + d[:, 6]
+    day = d[:, 8] * 10 + d[:, 9]
+    secs = (d[:, 11] * 10 + d[:, 12]) * 3600 + (d[:, 14] * 10 + d[:, 15]) * 60
+    secs += d[:, 17] * 10 + d[:, 18]
+
+    # days_from_civil (H. Hinnant), vectorized
+    y = y - (m <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * np.where(m > 2, m - 3, m + 9) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    days = era * 146097 + doe - 719468
+
+    hours = (days * 86400 + secs) / 3600
+    return np.where(ok, hours, np.nan)
+
+
+def score_batch(
+    items: Sequence[Candidate], now: Optional[datetime] = None
+) -> np.ndarray:
+    # Vectorized score_youtube / score_twitch over a whole candidate list
+    n = len(items)
+    if n == 0:
+        return np.zeros(0)
+
+    now_h = (now or datetime.now(timezone.utc)).timestamp() / 3600
+
+    # One Python pass to pull the columns out; everything after is NumPy
+    nan = float("nan")
+    rows: List[Tuple[float, float, float, float, float]] = []
+    stamps: List[str] = []
+    for it in items:
+        velocity = nan if it.view_velocity is None else it.view_velocity
+        if isinstance(it, YouTubeVideo):
+            rows.append((1.0, it.views, it.likes, it.comments, velocity))
+            stamps.append(it.published_at)
         else:
-            continue  # safety
+            rows.append((0.0, it.view_count, 0.0, 0.0, velocity))
+            stamps.append(it.created_at)
+
+    cols = np.fromiter(chain.from_iterable(rows), float, 5 * n).reshape(n, 5)
+    is_yt, views, likes, comments, measured = cols.T
+    is_yt = is_yt > 0
+
+    hours = np.maximum(now_h - _epoch_hours(stamps), 1)
+
+    view_velocity = np.where(np.isnan(measured), views / hours, measured)
+    yt_score = view_velocity * 0.6 + (likes / hours) * 0.2 + (comments / hours) * 0.2
+    tw_score = view_velocity * 0.9
+
+    scores = np.where(is_yt, yt_score, tw_score)
+    # Unparseable timestamps rank last instead of blowing up the cycle
+    return np.nan_to_num(scores, nan=0.0)
+
+
+def rank_candidates(all_items: List[Candidate]) -> List[Tuple[float, Candidate]]:
+    items = [it for it in all_items if isinstance(it, (YouTubeVideo, TwitchVOD))]
+    scores = score_batch(items)
+    order = np.argsort(-scores, kind="stable")
+    return [(float(scores[i]), items[i]) for i in order]
+
+
+def iter_top_candidates(
+    all_items: Sequence[Candidate],
+    exclude: AbstractSet[str] = frozenset(),
+) -> Iterator[Tuple[float, Candidate]]:
+    # Best-first, skipping ids in `exclude`. Only sorts as much as is consumed:
+    # each round partitions out the next top-k window instead of a full sort.
+    items = [it for it in all_items if isinstance(it, (YouTubeVideo, TwitchVOD))]
+    n = len(items)
+    if n == 0:
+        return
+
+    scores = score_batch(items)
+    neg = -scores
+    seen = np.zeros(n, dtype=bool)
+    k = TOPK_START
+
+    while True:
+        k = min(k, n)
+        top = np.argpartition(neg, k - 1)[:k] if k < n else np.arange(n)
+        # Ties keep input order, matching rank_candidates
+        top = top[np.lexsort((top, neg[top]))]
 
-        scored.append((score, item))
+        for i in top:
+            if seen[i]:
+                continue
+            seen[i] = True
+            item = items[i]
+            if candidate_id(item) not in exclude:
+                yield float(scores[i]), item
 
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return scored
+        if k == n:
+            return
+        k *= 4
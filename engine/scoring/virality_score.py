@@ -12,7 +12,8 @@ def _hours_since(dt_str: str) -> float:
 
 def score_youtube(v: YouTubeVideo) -> float:
     h = _hours_since(v.published_at)
-    view_velocity = v.views / h
+    # Prefer measured velocity from snapshots over the lifetime average
+    view_velocity = v.view_velocity if v.view_velocity is not None else v.views / h
     like_velocity = v.likes / h
     comment_velocity = v.comments / h
 
@@ -25,7 +26,15 @@ def score_youtube(v: YouTubeVideo) -> float:
 
 def score_twitch(v: TwitchVOD) -> float:
     h = _hours_since(v.created_at)
-    view_velocity = v.view_count / h
+    view_velocity = (
+        v.view_velocity if v.view_velocity is not None else v.view_count / h
+    )
 
     # Twitch has less metadata, so scale views higher
     return view_velocity * 0.9
+
+
+def score_item(item: Union[YouTubeVideo, TwitchVOD]) -> float:
+    if isinstance(item, YouTubeVideo):
+        return score_youtube(item)
+    return score_twitch(item)
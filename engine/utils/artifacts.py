@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+ARTIFACT_DIR = Path(os.getenv("ARTIFACT_DIR", "data/artifacts"))
+# Short-lived intermediates (clips before they're stored, render temps,
+# extracted audio). Point at tmpfs or a fast local disk.
+SCRATCH_DIR = Path(os.getenv("SCRATCH_DIR", "data/tmp"))
+# 0 = unlimited
+MEDIA_CACHE_BYTES = int(float(os.getenv("MEDIA_CACHE_GB", "50")) * 1024**3)
+
+# Finals are the upload buffer: the upload path owns them, never evict
+EVICTABLE_STAGES = ("download", "clip", "analyze", "features")
+PIN_DIR = ".pins"
+STALE_PIN_S = 24 * 3600  # pins from other hosts older than this are ignored
+STALE_TEMP_S = 6 * 3600  # leftovers in scratch / download staging
+
+
+def scratch_path(*parts: str) -> Path:
+    p = SCRATCH_DIR.joinpath(*parts)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    return p
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_stale(directory: Path, max_age_s: float = STALE_TEMP_S) -> int:
+    # Delete files nobody touched in a while (crashed downloads, raw files
+    # a failed normalize left behind). Returns bytes freed.
+    if not directory.exists():
+        return 0
+    cutoff = time.time() - max_age_s
+    freed = 0
+    for f in directory.rglob("*"):
+        try:
+            st = f.stat()
+            if f.is_file() and st.st_mtime < cutoff:
+                f.unlink()
+                freed += st.st_size
+        except OSError:
+            continue
+    return freed
+
+
+def artifact_key(source_id: str, params: Dict[str, Any], version: int) -> str:
+    # Same source + same parameters + same stage code version = same output
+    blob = json.dumps(
+        {"source": source_id, "params": params, "version": version}, sort_keys=True
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class ArtifactStore:
+    # Stage outputs on disk, addressed by what produced them. A stage asks
+    # for its artifact first and only does the work when it's missing.
+    #
+    # data/artifacts/<stage>/<source_id>-<key><suffix>
+    #
+    # Doubles as the media cache: downloads and clips stay around for reuse
+    # until the store goes over `quota_bytes`, then the least recently used
+    # ones go first. Sources pinned by an in-flight job (in any process) are
+    # never evicted.
+
+    def __init__(
+        self, root: str | Path = ARTIFACT_DIR, quota_bytes: int = MEDIA_CACHE_BYTES
+    ) -> None:
+        self.root = Path(root)
+        self.quota_bytes = quota_bytes
+        self._lock = threading.Lock()
+        self._owner = f"{socket.gethostname()}.{os.getpid()}"
+        self._pins: Dict[str, int] = {}
+
+    def path(
+        self,
+        stage: str,
+        source_id: str,
+        params: Dict[str, Any],
+        version: int,
+        suffix: str = ".mp4",
+    ) -> Path:
+        key = artifact_key(source_id, params, version)
+        return self.root / stage / f"{source_id}-{key}{suffix}"
+
+    def get(
+        self,
+        stage: str,
+        source_id: str,
+        params: Dict[str, Any],
+        version: int,
+        suffix: str = ".mp4",
+    ) -> Optional[Path]:
+        p = self.path(stage, source_id, params, version, suffix)
+        if not (p.exists() and p.stat().st_size > 0):
+            return None
+        self._touch(p)
+        return p
+
+    def _touch(self, p: Path) -> None:
+        # mtime doubles as "last used" for LRU; works across processes
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+
+    def put(
+        self,
+        src: Path,
+        stage: str,
+        source_id: str,
+        params: Dict[str, Any],
+        version: int,
+        suffix: str = ".mp4",
+    ) -> Path:
+        # Moves `src` into the store; the rename is what makes it visible,
+        # so a crash mid-copy never leaves a half artifact behind.
+        dst = self.path(stage, source_id, params, version, suffix)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        self.make_room(Path(src).stat().st_size)
+        tmp = dst.with_name(dst.name + ".tmp")
+        try:
+            os.replace(src, tmp)
+        except OSError:
+            # Different filesystem
+            shutil.move(str(src), str(tmp))
+        os.replace(tmp, dst)
+        self._touch(dst)
+        return dst
+
+    def get_json(
+        self, stage: str, source_id: str, params: Dict[str, Any], version: int
+    ) -> Optional[Dict[str, Any]]:
+        p = self.path(stage, source_id, params, version, ".json")
+        if not p.exists():
+            return None
+        try:
+            return json.loads(p.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            return None
+
+    def put_json(
+        self,
+        value: Dict[str, Any],
+        stage: str,
+        source_id: str,
+        params: Dict[str, Any],
+        version: int,
+    ) -> Path:
+        dst = self.path(stage, source_id, params, version, ".json")
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(dst.name + ".tmp")
+        tmp.write_text(json.dumps(value), encoding="utf-8")
+        os.replace(tmp, dst)
+        return dst
+
+    # ----------------------------
+    # PINS
+    # ----------------------------
+    def _marker(self, source_id: str) -> Path:
+        # One marker file per (source, process); pins inside it are counted
+        return self.root / PIN_DIR / f"{source_id}@{self._owner}.pin"
+
+    def pin(self, source_id: str) -> None:
+        with self._lock:
+            n = self._pins.get(source_id, 0)
+            self._pins[source_id] = n + 1
+            if n == 0:
+                marker = self._marker(source_id)
+                marker.parent.mkdir(parents=True, exist_ok=True)
+                marker.touch()
+
+    def unpin(self, source_id: str) -> None:
+        with self._lock:
+            n = self._pins.get(source_id, 0)
+            if n > 1:
+                self._pins[source_id] = n - 1
+            elif n == 1:
+                del self._pins[source_id]
+                self._marker(source_id).unlink(missing_ok=True)
+
+    @contextmanager
+    def pinned(self, source_id: str) -> Iterator[None]:
+        self.pin(source_id)
+        try:
+            yield
+        finally:
+            self.unpin(source_id)
+
+    def _pinned_sources(self) -> set:
+        pins = set()
+        host = socket.gethostname()
+        now = time.time()
+        for marker in (self.root / PIN_DIR).glob("*@*"):
+            source_id, owner = marker.name.rsplit("@", 1)
+            m_host, pid, _ = owner.rsplit(".", 2)
+            try:
+                if m_host == host:
+                    stale = not (pid.isdigit() and _pid_alive(int(pid)))
+                else:
+                    stale = now - marker.stat().st_mtime > STALE_PIN_S
+            except OSError:
+                continue
+            if stale:
+                marker.unlink(missing_ok=True)
+            else:
+                pins.add(source_id)
+        return pins
+
+    # ----------------------------
+    # QUOTA / LRU
+    # ----------------------------
+    def _entries(self) -> List[Tuple[float, int, Path, str]]:
+        # (last used, size, path, source_id) for evictable artifacts
+        out = []
+        for stage in EVICTABLE_STAGES:
+            for f in (self.root / stage).glob("*"):
+                if f.name.endswith(".tmp"):
+                    continue
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                source_id = f.stem.rsplit("-", 1)[0]
+                out.append((st.st_mtime, st.st_size, f, source_id))
+        return out
+
+    def usage(self) -> int:
+        return sum(size for _, size, _, _ in self._entries())
+
+    def make_room(self, incoming: int = 0) -> int:
+        # Evict least recently used, unpinned artifacts until `incoming`
+        # more bytes fit under the quota. Returns bytes freed.
+        if self.quota_bytes <= 0:
+            return 0
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _, _ in entries)
+            if total + incoming <= self.quota_bytes:
+                return 0
+
+            pins = self._pinned_sources()
+            freed = 0
+            for _, size, f, source_id in sorted(entries):
+                if total + incoming - freed <= self.quota_bytes:
+                    break
+                if source_id in pins:
+                    continue
+                try:
+                    f.unlink()
+                except OSError:
+                    continue
+                freed += size
+
+        if total + incoming - freed > self.quota_bytes:
+            print("⚠️ Media cache over quota; everything left is pinned.")
+        if freed:
+            print(f"🧹 Media cache: evicted {freed / 1024**2:.0f} MB (LRU)")
+        return freed
+
+
+# One store per process: pins and the eviction lock only protect what they share
+store = ArtifactStore()
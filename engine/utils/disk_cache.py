@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+CACHE_DIR = Path("data/cache")
+
+
+class JsonCache:
+    # Small key/value store with per-entry TTL, persisted as one JSON file.
+    # Writes go to a temp file and are renamed into place so a crash never
+    # leaves a half-written cache behind.
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._data: Dict[str, Dict[str, Any]] = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (json.JSONDecodeError, OSError):
+            print(f"⚠️ Cache {self.path} unreadable. Starting empty.")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        if entry is None or entry.get("expires_at", 0) <= time.time():
+            return None
+        return entry.get("value")
+
+    def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        # Raw entry, even if expired (callers may want to revalidate it)
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key: str, value: Any, ttl_seconds: float, **extra: Any) -> None:
+        with self._lock:
+            self._data[key] = {
+                "value": value,
+                "expires_at": time.time() + ttl_seconds,
+                **extra,
+            }
+            self._dirty = True
+
+    def touch(self, key: str, ttl_seconds: float) -> None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                entry["expires_at"] = time.time() + ttl_seconds
+                self._dirty = True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._dirty = True
+
+    def prune(self, grace_seconds: float = 0) -> None:
+        cutoff = time.time() - grace_seconds
+        with self._lock:
+            dead = [k for k, e in self._data.items() if e.get("expires_at", 0) < cutoff]
+            for k in dead:
+                del self._data[k]
+            if dead:
+                self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self._data), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
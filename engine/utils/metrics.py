@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+METRICS_DIR = Path(os.getenv("METRICS_DIR", "data/metrics"))
+JSONL_PATH = METRICS_DIR / "stages.jsonl"
+# Point this into node_exporter's --collector.textfile.directory to scrape it
+PROM_PATH = Path(os.getenv("METRICS_PROM_PATH", str(METRICS_DIR / "viralengine.prom")))
+
+# ru_maxrss is KiB on Linux, bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+_STATUS = Path("/proc/self/status")
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+# Highest VmHWM seen before measure() reset it, so the lifetime peak
+# survives the per-stage resets
+_lifetime_hwm = 0
+_hwm_lock = threading.Lock()
+
+
+def _vm_hwm() -> Optional[int]:
+    # Peak RSS since start or the last reset (Linux only)
+    try:
+        for line in _STATUS.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_hwm() -> bool:
+    # Start a fresh VmHWM (and ru_maxrss) high-water mark from current RSS
+    global _lifetime_hwm
+    with _hwm_lock:
+        hwm = _vm_hwm()
+        if hwm is None:
+            return False
+        _lifetime_hwm = max(_lifetime_hwm, hwm)
+        try:
+            _CLEAR_REFS.write_text("5")
+        except OSError:
+            return False
+        return True
+
+
+def peak_rss() -> Tuple[int, int]:
+    # Process-lifetime peaks: own, and the largest child reaped so far
+    if resource is None:
+        return 0, 0
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, _lifetime_hwm, _vm_hwm() or 0), kids * _RSS_UNIT
+
+
+def child_cpu_s() -> float:
+    # ffmpeg / yt-dlp do most of the work; only counts children already reaped
+    t = os.times()
+    return t.children_user + t.children_system
+
+
+@dataclass
+class StageSample:
+    stage: str
+    video_id: Optional[str] = None
+    cycle: Optional[str] = None
+    started_at: str = ""
+    status: str = "ok"
+    wall_s: float = 0.0
+    # CPU of the measuring thread only; helper threads it starts aren't in it
+    cpu_s: float = 0.0
+    # Child CPU and peak RSS are process-wide, so they're only reported for
+    # a stage that had the process to itself: None once another thread's
+    # stage overlapped it (`shared`), or where the OS can't tell
+    child_cpu_s: Optional[float] = None
+    peak_rss_bytes: Optional[int] = None
+    shared: bool = False
+    frames: int = 0
+    bytes: int = 0
+    parent: Optional["StageSample"] = field(default=None, repr=False)
+    # Peak RSS seen before a sub-step reset the high-water mark
+    _seen_hwm: int = field(default=0, repr=False)
+    _hwm_reset: bool = field(default=False, repr=False)
+
+    def add(self, frames: int = 0, nbytes: int = 0) -> None:
+        self.frames += frames
+        self.bytes += nbytes
+
+    def to_json(self) -> Dict[str, object]:
+        d = asdict(self)
+        for k in ("parent", "_seen_hwm", "_hwm_reset"):
+            d.pop(k)
+        d["fps"] = self.frames / self.wall_s if self.wall_s > 0 else 0.0
+        d["bytes_per_s"] = self.bytes / self.wall_s if self.wall_s > 0 else 0.0
+        return d
+
+
+class MetricsRecorder:
+    # Appends one JSON line per measured stage and rewrites a Prometheus
+    # textfile with running totals after each one.
+
+    def __init__(self, jsonl_path: Path = JSONL_PATH, prom_path: Path = PROM_PATH):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        self._runs: Dict[Tuple[str, str], int] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._last: Dict[str, StageSample] = {}
+
+    def record(self, s: StageSample) -> None:
+        line = json.dumps(s.to_json())
+        with self._lock:
+            self._runs[(s.stage, s.status)] = self._runs.get((s.stage, s.status), 0) + 1
+            tot = self._totals.setdefault(
+                s.stage, {"wall": 0.0, "cpu": 0.0, "frames": 0.0, "bytes": 0.0}
+            )
+            tot["wall"] += s.wall_s
+            tot["cpu"] += s.cpu_s + (s.child_cpu_s or 0.0)
+            tot["frames"] += s.frames
+            tot["bytes"] += s.bytes
+            self._last[s.stage] = s
+
+            try:
+                self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                self._write_prom()
+            except OSError as e:
+                print("⚠️ Could not write metrics:", e)
+
+    def _write_prom(self) -> None:
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_: str, rows: List[str]) -> None:
+            lines.append(f"# HELP viralengine_{name} {help_}")
+            lines.append(f"# TYPE viralengine_{name} {kind}")
+            lines.extend(f"viralengine_{name}{row}" for row in rows)
+
+        metric(
+            "stage_runs_total",
+            "counter",
+            "Stage executions by outcome.",
+            [
+                f'{{stage="{st}",status="{status}"}} {n}'
+                for (st, status), n in sorted(self._runs.items())
+            ],
+        )
+        for key, name, help_ in (
+            ("wall", "stage_wall_seconds_total", "Wall time spent in the stage."),
+            (
+                "cpu",
+                "stage_cpu_seconds_total",
+                "Stage thread CPU, plus children's when the stage ran alone.",
+            ),
+            ("frames", "stage_frames_total", "Video frames processed."),
+            ("bytes", "stage_bytes_total", "Bytes downloaded, written or uploaded."),
+        ):
+            metric(
+                name,
+                "counter",
+                help_,
+                [
+                    f'{{stage="{st}"}} {tot[key]:.6g}'
+                    for st, tot in sorted(self._totals.items())
+                ],
+            )
+        metric(
+            "stage_last_wall_seconds",
+            "gauge",
+            "Wall time of the most recent run.",
+            [f'{{stage="{st}"}} {s.wall_s:.6g}' for st, s in sorted(self._last.items())],
+        )
+        own, kids = peak_rss()
+        metric(
+            "process_peak_rss_bytes",
+            "gauge",
+            "Peak resident memory over the process lifetime (largest child for children).",
+            [f'{{process="self"}} {own}', f'{{process="children"}} {kids}'],
+        )
+
+        self.prom_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.prom_path.with_name(self.prom_path.name + ".tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, self.prom_path)
+
+
+recorder = MetricsRecorder()
+
+_local = threading.local()
+_cycle: Optional[str] = None
+# Open samples by thread, to tell which stages overlapped another thread's
+_open_lock = threading.Lock()
+_open: Dict[int, List[StageSample]] = {}
+
+
+def _enter(s: StageSample) -> None:
+    me = threading.get_ident()
+    with _open_lock:
+        others = [o for tid, samples in _open.items() if tid != me for o in samples]
+        if others:
+            s.shared = True
+            for o in others:
+                o.shared = True
+        _open.setdefault(me, []).append(s)
+
+
+def _leave(s: StageSample) -> None:
+    me = threading.get_ident()
+    with _open_lock:
+        samples = [o for o in _open.get(me, []) if o is not s]
+        if samples:
+            _open[me] = samples
+        else:
+            _open.pop(me, None)
+
+
+def begin_cycle() -> str:
+    # Tag everything measured from here on with one cycle id
+    global _cycle
+    _cycle = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return _cycle
+
+
+def current() -> Optional[StageSample]:
+    return getattr(_local, "sample", None)
+
+
+def add(frames: int = 0, nbytes: int = 0) -> None:
+    # Count work against the innermost stage being measured on this thread
+    s = current()
+    if s is not None:
+        s.add(frames, nbytes)
+
+
+@contextmanager
+def measure(stage: str, video_id: Optional[str] = None) -> Iterator[StageSample]:
+    parent = current()
+    s = StageSample(
+        stage=stage,
+        video_id=video_id or (parent.video_id if parent else None),
+        cycle=_cycle,
+        started_at=datetime.now(timezone.utc).isoformat(),
+        parent=parent,
+    )
+    _local.sample = s
+    _enter(s)
+    if not s.shared:
+        # A sub-step's reset hides what the enclosing stage saw so far
+        if parent is not None:
+            parent._seen_hwm = max(parent._seen_hwm, _vm_hwm() or 0)
+        s._hwm_reset = _reset_hwm()
+
+    t0, c0, k0 = time.perf_counter(), time.thread_time(), child_cpu_s()
+    try:
+        yield s
+    except BaseException:
+        s.status = "error"
+        raise
+    finally:
+        s.wall_s = time.perf_counter() - t0
+        s.cpu_s = time.thread_time() - c0
+        kids = child_cpu_s() - k0
+        hwm = _vm_hwm()
+        _leave(s)
+        if not s.shared:
+            s.child_cpu_s = kids
+            if s._hwm_reset and hwm is not None:
+                s.peak_rss_bytes = max(s._seen_hwm, hwm)
+        if parent is not None:
+            parent._seen_hwm = max(parent._seen_hwm, hwm or 0)
+        _local.sample = parent
+        if parent is not None:
+            # Sub-steps roll their frames/bytes up into the enclosing stage
+            parent.add(s.frames, s.bytes)
+        recorder.record(s)
+
+
+def file_size(path: object) -> int:
+    try:
+        return Path(str(path)).stat().st_size
+    except OSError:
+        return 0
@@ -1,10 +1,33 @@
 import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from .registry_sqlite import SqliteRegistry, clip_key, clips_overlap
 
 REG_PATH = Path("data/processed_registry.json")
 REG_PATH.parent.mkdir(parents=True, exist_ok=True)
+DB_PATH = Path("data/registry.db")
+
+# "sqlite" (default) or "json" for the legacy single-file registry
+REGISTRY_BACKEND = os.getenv("REGISTRY_BACKEND", "sqlite").strip().lower()
+
+
+# Per-short fields; a pre-clips registry kept them on the source entry
+CLIP_FIELDS = (
+    "creator",
+    "title",
+    "description",
+    "processed_at",
+    "clip_start",
+    "clip_end",
+    "final_path",
+    "uploaded_at",
+    "youtube_video_id",
+)
 
 
 def _now_iso() -> str:
@@ -14,33 +37,334 @@ def _now_iso() -> str:
 def _default() -> Dict[str, Any]:
     return {
         "videos": {},  # keyed by source video_id/vod_id
+        "clips": {},  # keyed by clip_key: the shorts cut from those sources
         "last_cycle_at": None,  # scheduler heartbeat
         "upload_history": [],  # list of uploaded shorts (final outputs)
+        "jobs": {},  # scheduler job name -> last run
+        "checkpoints": {},  # video_id -> stage -> checkpoint data
     }
 
 
-def _load() -> Dict[str, Any]:
-    if not REG_PATH.exists():
-        REG_PATH.write_text(json.dumps(_default(), indent=2))
-        return _default()
+class JsonRegistry:
+    # Keeps the registry in memory and only touches the disk when needed:
+    # reads stat() the file and reparse it only if another process changed
+    # it, and writes inside transaction() are flushed once, atomically
+    # (temp file + fsync + rename), when the outermost transaction exits.
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._data: Optional[Dict[str, Any]] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._depth = 0
+        self._dirty = False
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _read(self) -> Dict[str, Any]:
+        if not self.path.exists():
+            data = _default()
+            self._write(data)
+            return data
+
+        try:
+            return json.loads(self.path.read_text())
+        except json.JSONDecodeError:
+            # Keep the broken file for inspection instead of overwriting it
+            backup = self.path.with_name(self.path.name + ".corrupt")
+            print(f"⚠️ Registry corrupted. Moved to {backup}, starting fresh.")
+            os.replace(self.path, backup)
+            data = _default()
+            self._write(data)
+            return data
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(json.dumps(data, indent=2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._stamp = self._file_stamp()
+
+    def _load(self) -> Dict[str, Any]:
+        with self._lock:
+            # Inside a transaction our in-memory copy is authoritative
+            if self._data is not None and (
+                self._depth > 0 or self._file_stamp() == self._stamp
+            ):
+                return self._data
+            self._data = self._read()
+            self._stamp = self._file_stamp()
+            if "clips" not in self._data:
+                self._clips_from_videos(self._data)
+            return self._data
+
+    def _clips_from_videos(self, data: Dict[str, Any]) -> None:
+        # Registries from before per-clip tracking: the one short each source
+        # had lived on its videos entry. Those sources were used up under the
+        # old one-short-per-source rule and stay out of the candidate pool.
+        clips = data.setdefault("clips", {})
+        for vid, v in data["videos"].items():
+            if v.get("final_path"):
+                v["exhausted"] = True
+                key = clip_key(vid, v.get("clip_start") or 0, v.get("clip_end") or 0)
+                clips.setdefault(
+                    key,
+                    {
+                        "video_id": vid,
+                        **{k: v.get(k) for k in CLIP_FIELDS},
+                        "uploaded": v.get("uploaded", False),
+                    },
+                )
+        self._save(data)
+
+    def _save(self, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data = data
+            if self._depth > 0:
+                self._dirty = True
+                return
+            self._write(data)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # Write batching, not rollback: whatever was written is flushed on
+        # exit even if the body raised.
+        with self._lock:
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if self._depth == 0 and self._dirty and self._data is not None:
+                    self._write(self._data)
+                    self._dirty = False
+
+    # ----------------------------
+    # SOURCE VIDEO TRACKING
+    # ----------------------------
+    def is_video_used(self, video_id: str) -> bool:
+        return video_id in self._load()["videos"]
+
+    def used_video_ids(self) -> Set[str]:
+        # Sources with no unused moment left
+        return {vid for vid, v in self._load()["videos"].items() if v.get("exhausted")}
+
+    def set_exhausted(self, video_id: str) -> None:
+        with self._lock:
+            data = self._load()
+            data["videos"].setdefault(video_id, {})["exhausted"] = True
+            self._save(data)
+
+    def upsert_processed(
+        self,
+        video_id: str,
+        creator: str,
+        title: str,
+        description: str,
+        clip_start: float,
+        clip_end: float,
+        final_path: str,
+    ) -> None:
+        with self._lock:
+            data = self._load()
+            fields = {
+                "creator": creator,
+                "title": title,
+                "description": description,
+                "processed_at": _now_iso(),
+                "clip_start": clip_start,
+                "clip_end": clip_end,
+                "final_path": final_path,
+            }
+            c = data["clips"].setdefault(
+                clip_key(video_id, clip_start, clip_end), {"video_id": video_id}
+            )
+            c.update(fields)
+            c.setdefault("uploaded", False)
+            # The source entry mirrors its latest short
+            v = data["videos"].setdefault(video_id, {})
+            v.update(fields)
+            v.setdefault("uploaded", False)
+            self._save(data)
+
+    def is_clip_used(self, video_id: str, start: float, end: float) -> bool:
+        # Overlaps a rendered short of the same source; a claim a crashed job
+        # left behind doesn't count
+        return any(
+            clips_overlap(start, end, c.get("clip_start"), c.get("clip_end"))
+            for c in self._load()["clips"].values()
+            if c.get("video_id") == video_id and c.get("final_path")
+        )
+
+    def set_clip_key(self, video_id: str, start: float, end: float) -> None:
+        with self._lock:
+            data = self._load()
+            key = clip_key(video_id, start, end)
+            if key not in data["clips"]:
+                data["clips"][key] = {
+                    "video_id": video_id,
+                    "clip_start": start,
+                    "clip_end": end,
+                }
+                self._save(data)
+
+    def get_clip(
+        self, video_id: str, start: float, end: float
+    ) -> Optional[Dict[str, Any]]:
+        key = clip_key(video_id, start, end)
+        c = self._load()["clips"].get(key)
+        return {"clip_key": key, **c} if c is not None else None
+
+    # ----------------------------
+    # UPLOAD TRACKING
+    # ----------------------------
+    def mark_uploaded(
+        self, video_id: str, youtube_video_id: str, clip_start: float, clip_end: float
+    ) -> None:
+        with self._lock:
+            data = self._load()
+            c = data["clips"].get(clip_key(video_id, clip_start, clip_end))
+            if not c:
+                return
+            upload = {
+                "uploaded": True,
+                "uploaded_at": _now_iso(),
+                "youtube_video_id": youtube_video_id,
+            }
+            c.update(upload)
+            data["videos"].setdefault(video_id, {}).update(upload)
+
+            data["upload_history"].append(
+                {
+                    "source_video_id": video_id,
+                    "youtube_video_id": youtube_video_id,
+                    "uploaded_at": c["uploaded_at"],
+                    "final_path": c.get("final_path"),
+                    "title": c.get("title"),
+                }
+            )
+            self._save(data)
+
+    def get_video(self, video_id: str) -> Optional[Dict[str, Any]]:
+        v = self._load()["videos"].get(video_id)
+        return {"video_id": video_id, **v} if v is not None else None
+
+    def pending_uploads(self) -> List[Dict[str, Any]]:
+        clips = self._load()["clips"]
+        ready = [
+            {"clip_key": key, **c}
+            for key, c in clips.items()
+            if c.get("final_path") and not c.get("uploaded")
+        ]
+        ready.sort(key=lambda v: v.get("processed_at") or "")
+        return ready
+
+    def get_last_cycle_at(self) -> Optional[str]:
+        return self._load().get("last_cycle_at")
+
+    def set_last_cycle_at(self) -> None:
+        with self._lock:
+            data = self._load()
+            data["last_cycle_at"] = _now_iso()
+            self._save(data)
+
+    # ----------------------------
+    # STAGE CHECKPOINTS
+    # ----------------------------
+    def set_checkpoint(self, video_id: str, stage: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            d = self._load()
+            stages = d.setdefault("checkpoints", {}).setdefault(video_id, {})
+            stages[stage] = {**data, "at": _now_iso()}
+            self._save(d)
+
+    def get_checkpoints(self, video_id: str) -> Dict[str, Dict[str, Any]]:
+        stages = (self._load().get("checkpoints") or {}).get(video_id) or {}
+        return {
+            stage: {k: v for k, v in cp.items() if k != "at"}
+            for stage, cp in stages.items()
+        }
+
+    def clear_checkpoints(self, video_id: str) -> None:
+        with self._lock:
+            d = self._load()
+            if (d.get("checkpoints") or {}).pop(video_id, None) is not None:
+                self._save(d)
+
+    def resumable_ids(self) -> List[str]:
+        # A rendered job clears its checkpoints, and a source's earlier shorts
+        # don't make a new one done
+        d = self._load()
+        started = [
+            (min(cp.get("at", "") for cp in stages.values()), vid)
+            for vid, stages in (d.get("checkpoints") or {}).items()
+            if stages
+        ]
+        return [vid for _, vid in sorted(started)]
+
+    def get_job_last_run(self, name: str) -> Optional[str]:
+        return (self._load().get("jobs") or {}).get(name)
+
+    def set_job_last_run(self, name: str, at: Optional[str] = None) -> None:
+        with self._lock:
+            data = self._load()
+            data.setdefault("jobs", {})[name] = at or _now_iso()
+            self._save(data)
 
-    try:
-        return json.loads(REG_PATH.read_text())
-    except json.JSONDecodeError:
-        print("⚠️ Registry corrupted. Resetting file.")
-        REG_PATH.write_text(json.dumps(_default(), indent=2))
-        return _default()
 
+Registry = Union[JsonRegistry, SqliteRegistry]
 
-def _save(data: Dict[str, Any]) -> None:
-    REG_PATH.write_text(json.dumps(data, indent=2))
+_registry: Optional[Registry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            if REGISTRY_BACKEND == "json":
+                _registry = JsonRegistry(REG_PATH)
+            else:
+                db = SqliteRegistry(DB_PATH)
+                db.migrate_json(REG_PATH)
+                _registry = db
+        return _registry
+
+
+@contextmanager
+def transaction() -> Iterator[None]:
+    # A few related writes as one unit: one flush on the JSON backend, one
+    # commit on SQLite. Everything inside is lost together on a crash, and
+    # other writers wait (SQLite) or get overwritten (JSON) meanwhile, so
+    # keep it to quick registry calls; never wrap uploads, a stage's work or
+    # anything that runs for minutes.
+    with get_registry().transaction():
+        yield
 
 
 # ----------------------------
 # SOURCE VIDEO TRACKING
 # ----------------------------
 def is_video_used(video_id: str) -> bool:
-    return video_id in _load()["videos"]
+    return get_registry().is_video_used(video_id)
+
+
+def used_video_ids() -> Set[str]:
+    # Sources with every moment already produced; one registry read for a
+    # whole ranking pass
+    return get_registry().used_video_ids()
+
+
+def set_exhausted(video_id: str) -> None:
+    get_registry().set_exhausted(video_id)
 
 
 def upsert_processed(
@@ -52,71 +376,78 @@ def upsert_processed(
     clip_end: float,
     final_path: str,
 ) -> None:
-    data = _load()
-    v = data["videos"].setdefault(video_id, {})
-    v.update(
-        {
-            "creator": creator,
-            "title": title,
-            "description": description,
-            "processed_at": _now_iso(),
-            "clip_start": clip_start,
-            "clip_end": clip_end,
-            "final_path": final_path,
-            "uploaded": v.get("uploaded", False),
-            "uploaded_at": v.get("uploaded_at"),
-            "youtube_video_id": v.get("youtube_video_id"),
-        }
+    get_registry().upsert_processed(
+        video_id=video_id,
+        creator=creator,
+        title=title,
+        description=description,
+        clip_start=clip_start,
+        clip_end=clip_end,
+        final_path=final_path,
     )
-    _save(data)
 
 
 def is_clip_used(video_id: str, start: float, end: float) -> bool:
-    data = _load()
-    v = data["videos"].get(video_id)
-    if not v:
-        return False
-    # unique identity without file hashing
-    key = f"{video_id}|{int(start)}|{int(end)}"
-    return v.get("clip_key") == key
+    return get_registry().is_clip_used(video_id, start, end)
 
 
 def set_clip_key(video_id: str, start: float, end: float) -> None:
-    data = _load()
-    v = data["videos"].setdefault(video_id, {})
-    v["clip_key"] = f"{video_id}|{int(start)}|{int(end)}"
-    _save(data)
+    get_registry().set_clip_key(video_id, start, end)
+
+
+def get_clip(video_id: str, start: float, end: float) -> Optional[Dict[str, Any]]:
+    return get_registry().get_clip(video_id, start, end)
 
 
 # ----------------------------
 # UPLOAD TRACKING
 # ----------------------------
-def mark_uploaded(video_id: str, youtube_video_id: str) -> None:
-    data = _load()
-    v = data["videos"].get(video_id)
-    if not v:
-        return
-    v["uploaded"] = True
-    v["uploaded_at"] = _now_iso()
-    v["youtube_video_id"] = youtube_video_id
-
-    data["upload_history"].append(
-        {
-            "source_video_id": video_id,
-            "youtube_video_id": youtube_video_id,
-            "uploaded_at": v["uploaded_at"],
-            "final_path": v.get("final_path"),
-            "title": v.get("title"),
-        }
-    )
-    _save(data)
+def mark_uploaded(
+    video_id: str, youtube_video_id: str, clip_start: float, clip_end: float
+) -> None:
+    get_registry().mark_uploaded(video_id, youtube_video_id, clip_start, clip_end)
+
+
+def get_video(video_id: str) -> Optional[Dict[str, Any]]:
+    return get_registry().get_video(video_id)
+
+
+def pending_uploads() -> List[Dict[str, Any]]:
+    # Rendered but not yet uploaded shorts, oldest first
+    return get_registry().pending_uploads()
 
 
 def get_last_cycle_at() -> Optional[str]:
-    return _load().get("last_cycle_at")
+    return get_registry().get_last_cycle_at()
 
 
 def set_last_cycle_at() -> None:
-    data = _load()
-    data["last_cycle_at"] = _now_iso()
-    _save(data)
+    get_registry().set_last_cycle_at()
+
+
+def get_job_last_run(name: str) -> Optional[str]:
+    return get_registry().get_job_last_run(name)
+
+
+def set_job_last_run(name: str, at: Optional[str] = None) -> None:
+    get_registry().set_job_last_run(name, at)
+
+
+# ----------------------------
+# STAGE CHECKPOINTS
+# ----------------------------
+def set_checkpoint(video_id: str, stage: str, data: Dict[str, Any]) -> None:
+    get_registry().set_checkpoint(video_id, stage, data)
+
+
+def get_checkpoints(video_id: str) -> Dict[str, Dict[str, Any]]:
+    return get_registry().get_checkpoints(video_id)
+
+
+def clear_checkpoints(video_id: str) -> None:
+    get_registry().clear_checkpoints(video_id)
+
+
+def resumable_ids() -> List[str]:
+    # Videos a crashed cycle left half-produced, oldest first
+    return get_registry().resumable_ids()
@@ -0,0 +1,499 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    creator TEXT,
+    title TEXT,
+    description TEXT,
+    processed_at TEXT,
+    clip_start REAL,
+    clip_end REAL,
+    final_path TEXT,
+    uploaded INTEGER NOT NULL DEFAULT 0,
+    uploaded_at TEXT,
+    youtube_video_id TEXT,
+    clip_key TEXT,
+    exhausted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_videos_clip_key ON videos(clip_key);
+
+CREATE TABLE IF NOT EXISTS clips (
+    clip_key TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    clip_start REAL,
+    clip_end REAL,
+    creator TEXT,
+    title TEXT,
+    description TEXT,
+    processed_at TEXT,
+    final_path TEXT,
+    uploaded INTEGER NOT NULL DEFAULT 0,
+    uploaded_at TEXT,
+    youtube_video_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_clips_video ON clips(video_id);
+CREATE INDEX IF NOT EXISTS idx_clips_pending ON clips(uploaded, processed_at);
+
+CREATE TABLE IF NOT EXISTS upload_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_video_id TEXT NOT NULL,
+    youtube_video_id TEXT,
+    uploaded_at TEXT,
+    final_path TEXT,
+    title TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_upload_history_source
+    ON upload_history(source_video_id);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    video_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    data TEXT,
+    at TEXT NOT NULL,
+    PRIMARY KEY (video_id, stage)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+INSERT_HISTORY = (
+    "INSERT INTO upload_history"
+    " (source_video_id, youtube_video_id, uploaded_at, final_path, title)"
+    " VALUES (?, ?, ?, ?, ?)"
+)
+
+VIDEO_COLUMNS = (
+    "creator",
+    "title",
+    "description",
+    "processed_at",
+    "clip_start",
+    "clip_end",
+    "final_path",
+    "uploaded",
+    "uploaded_at",
+    "youtube_video_id",
+    "clip_key",
+)
+
+
+# Shared by the registry and the job queue, which queue workers on other
+# hosts write too. Rollback journal, not WAL: WAL's index lives in shared
+# memory and only works for processes on one host; the rollback journal
+# relies on file locks alone, so the files can sit on a shared disk as long
+# as its fcntl locks actually work (NFS/SMB often don't). synchronous=NORMAL
+# is only crash-safe with WAL.
+JOURNAL_MODE = "DELETE"
+SYNCHRONOUS = "FULL"
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def clip_key(video_id: str, start: float, end: float) -> str:
+    # unique identity without file hashing
+    return f"{video_id}|{int(start)}|{int(end)}"
+
+
+# A moment sharing more than this much of its window with a produced short
+# is the same highlight, whatever its exact bounds
+CLIP_OVERLAP_MAX = 0.5
+
+
+def clips_overlap(
+    start: float, end: float, other_start: Optional[float], other_end: Optional[float]
+) -> bool:
+    if other_start is None or other_end is None or end <= start:
+        return False
+    shared = min(end, other_end) - max(start, other_start)
+    return shared > CLIP_OVERLAP_MAX * (end - start)
+
+
+class SqliteRegistry:
+    # Registry in SQLite: point lookups by index instead of reparsing a
+    # growing JSON file, and a crash can't leave a half-written registry.
+    #
+    # `videos` has one row per source, `clips` one per short cut from it
+    # (a source yields several); uploads are tracked per clip.
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(videos)")}
+        if columns and "exhausted" not in columns:
+            conn.execute(
+                "ALTER TABLE videos ADD COLUMN exhausted INTEGER NOT NULL DEFAULT 0"
+            )
+        conn.executescript(SCHEMA)
+        if not self._meta("clips_from_videos"):
+            with self._tx() as conn:
+                self._clips_from_videos(conn)
+                self._set_meta(conn, "clips_from_videos", _now_iso())
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        if getattr(self._local, "depth", 0) > 0:
+            # Inside transaction(): its BEGIN covers this write
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # This thread's writes inside commit together, or not at all. Holds
+        # the write lock for every process until the end, so only a few quick
+        # registry calls belong in here, never downloads, renders or uploads.
+        depth = getattr(self._local, "depth", 0)
+        if depth > 0:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        with self._tx():
+            self._local.depth = 1
+            try:
+                yield
+            finally:
+                self._local.depth = 0
+
+    # ----------------------------
+    # ONE-TIME JSON MIGRATION
+    # ----------------------------
+    def migrate_json(self, json_path: Path) -> None:
+        if not json_path.exists() or self._meta("migrated_from_json"):
+            return
+
+        columns = ", ".join(VIDEO_COLUMNS)
+        with self._tx() as conn:
+            # Checked again under the write lock: processes starting together
+            # all get past the check above, only the first may import
+            if self._meta("migrated_from_json"):
+                return
+            try:
+                data = json.loads(json_path.read_text())
+            except FileNotFoundError:
+                return
+            except json.JSONDecodeError:
+                print("⚠️ Old JSON registry unreadable, not migrating it.")
+                return
+
+            videos: Dict[str, Dict[str, Any]] = data.get("videos") or {}
+            history = data.get("upload_history") or []
+            for video_id, v in videos.items():
+                row = {col: v.get(col) for col in VIDEO_COLUMNS}
+                row["uploaded"] = int(bool(v.get("uploaded")))
+                conn.execute(
+                    f"INSERT OR REPLACE INTO videos (video_id, {columns})"
+                    f" VALUES (?{', ?' * len(VIDEO_COLUMNS)})",
+                    (video_id, *row.values()),
+                )
+            for h in history:
+                conn.execute(
+                    INSERT_HISTORY,
+                    (
+                        h.get("source_video_id"),
+                        h.get("youtube_video_id"),
+                        h.get("uploaded_at"),
+                        h.get("final_path"),
+                        h.get("title"),
+                    ),
+                )
+            for video_id, stages in (data.get("checkpoints") or {}).items():
+                for stage, cp in stages.items():
+                    conn.execute(
+                        "INSERT OR REPLACE INTO checkpoints (video_id, stage, data, at)"
+                        " VALUES (?, ?, ?, ?)",
+                        (video_id, stage, json.dumps(cp), cp.get("at") or _now_iso()),
+                    )
+            self._clips_from_videos(conn, list(videos))
+            if data.get("last_cycle_at"):
+                self._set_meta(conn, "last_cycle_at", data["last_cycle_at"])
+            self._set_meta(conn, "migrated_from_json", _now_iso())
+
+        # Keep the old file around, but out of the way
+        try:
+            json_path.rename(json_path.with_name(json_path.name + ".migrated"))
+        except FileNotFoundError:
+            pass
+        print(f"📦 Migrated {len(videos)} videos from {json_path} to {self.path}")
+
+    def _clips_from_videos(
+        self, conn: sqlite3.Connection, video_ids: Optional[List[str]] = None
+    ) -> None:
+        # Registries from before per-clip tracking: the one short each source
+        # had lived on its videos row. Those sources were used up under the
+        # old one-short-per-source rule and stay out of the candidate pool.
+        rows = conn.execute(
+            "SELECT * FROM videos WHERE final_path IS NOT NULL"
+        ).fetchall()
+        if video_ids is not None:
+            wanted = set(video_ids)
+            rows = [v for v in rows if v["video_id"] in wanted]
+        for v in rows:
+            conn.execute(
+                "UPDATE videos SET exhausted = 1 WHERE video_id = ?", (v["video_id"],)
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO clips (clip_key, video_id, clip_start,"
+                " clip_end, creator, title, description, processed_at, final_path,"
+                " uploaded, uploaded_at, youtube_video_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    clip_key(v["video_id"], v["clip_start"] or 0, v["clip_end"] or 0),
+                    v["video_id"],
+                    v["clip_start"],
+                    v["clip_end"],
+                    v["creator"],
+                    v["title"],
+                    v["description"],
+                    v["processed_at"],
+                    v["final_path"],
+                    v["uploaded"],
+                    v["uploaded_at"],
+                    v["youtube_video_id"],
+                ),
+            )
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value: str) -> None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    # ----------------------------
+    # SOURCE VIDEO TRACKING
+    # ----------------------------
+    def is_video_used(self, video_id: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM videos WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        return row is not None
+
+    def used_video_ids(self) -> Set[str]:
+        # Sources with no unused moment left
+        rows = self._conn().execute("SELECT video_id FROM videos WHERE exhausted = 1")
+        return {r["video_id"] for r in rows}
+
+    def set_exhausted(self, video_id: str) -> None:
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO videos (video_id, exhausted) VALUES (?, 1)"
+                " ON CONFLICT(video_id) DO UPDATE SET exhausted = 1",
+                (video_id,),
+            )
+
+    def upsert_processed(
+        self,
+        video_id: str,
+        creator: str,
+        title: str,
+        description: str,
+        clip_start: float,
+        clip_end: float,
+        final_path: str,
+    ) -> None:
+        now = _now_iso()
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO clips (clip_key, video_id, clip_start, clip_end,"
+                " creator, title, description, processed_at, final_path)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(clip_key) DO UPDATE SET"
+                " clip_start = excluded.clip_start, clip_end = excluded.clip_end,"
+                " creator = excluded.creator, title = excluded.title,"
+                " description = excluded.description,"
+                " processed_at = excluded.processed_at,"
+                " final_path = excluded.final_path",
+                (
+                    clip_key(video_id, clip_start, clip_end),
+                    video_id,
+                    clip_start,
+                    clip_end,
+                    creator,
+                    title,
+                    description,
+                    now,
+                    final_path,
+                ),
+            )
+            # The source row mirrors its latest short
+            conn.execute(
+                "INSERT INTO videos (video_id, creator, title, description,"
+                " processed_at, clip_start, clip_end, final_path)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(video_id) DO UPDATE SET"
+                " creator = excluded.creator, title = excluded.title,"
+                " description = excluded.description,"
+                " processed_at = excluded.processed_at,"
+                " clip_start = excluded.clip_start, clip_end = excluded.clip_end,"
+                " final_path = excluded.final_path",
+                (
+                    video_id,
+                    creator,
+                    title,
+                    description,
+                    now,
+                    clip_start,
+                    clip_end,
+                    final_path,
+                ),
+            )
+
+    def is_clip_used(self, video_id: str, start: float, end: float) -> bool:
+        # Overlaps a rendered short of the same source; a claim a crashed job
+        # left behind doesn't count
+        rows = self._conn().execute(
+            "SELECT clip_start, clip_end FROM clips"
+            " WHERE video_id = ? AND final_path IS NOT NULL",
+            (video_id,),
+        )
+        return any(
+            clips_overlap(start, end, r["clip_start"], r["clip_end"]) for r in rows
+        )
+
+    def set_clip_key(self, video_id: str, start: float, end: float) -> None:
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO clips (clip_key, video_id, clip_start, clip_end)"
+                " VALUES (?, ?, ?, ?)",
+                (clip_key(video_id, start, end), video_id, start, end),
+            )
+
+    def get_clip(
+        self, video_id: str, start: float, end: float
+    ) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT * FROM clips WHERE clip_key = ?", (clip_key(video_id, start, end),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    # ----------------------------
+    # UPLOAD TRACKING
+    # ----------------------------
+    def mark_uploaded(
+        self, video_id: str, youtube_video_id: str, clip_start: float, clip_end: float
+    ) -> None:
+        now = _now_iso()
+        key = clip_key(video_id, clip_start, clip_end)
+        with self._tx() as conn:
+            v = conn.execute(
+                "SELECT final_path, title FROM clips WHERE clip_key = ?", (key,)
+            ).fetchone()
+            if v is None:
+                return
+            conn.execute(
+                "UPDATE clips SET uploaded = 1, uploaded_at = ?, youtube_video_id = ?"
+                " WHERE clip_key = ?",
+                (now, youtube_video_id, key),
+            )
+            conn.execute(
+                "UPDATE videos SET uploaded = 1, uploaded_at = ?, youtube_video_id = ?"
+                " WHERE video_id = ?",
+                (now, youtube_video_id, video_id),
+            )
+            conn.execute(
+                INSERT_HISTORY,
+                (video_id, youtube_video_id, now, v["final_path"], v["title"]),
+            )
+
+    def get_video(self, video_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT * FROM videos WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def pending_uploads(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT * FROM clips WHERE final_path IS NOT NULL AND uploaded = 0"
+            " ORDER BY processed_at"
+        )
+        return [dict(r) for r in rows]
+
+    def get_last_cycle_at(self) -> Optional[str]:
+        return self._meta("last_cycle_at")
+
+    def set_last_cycle_at(self) -> None:
+        with self._tx() as conn:
+            self._set_meta(conn, "last_cycle_at", _now_iso())
+
+    def get_job_last_run(self, name: str) -> Optional[str]:
+        return self._meta(f"job:{name}")
+
+    def set_job_last_run(self, name: str, at: Optional[str] = None) -> None:
+        with self._tx() as conn:
+            self._set_meta(conn, f"job:{name}", at or _now_iso())
+
+    # ----------------------------
+    # STAGE CHECKPOINTS
+    # ----------------------------
+    def set_checkpoint(self, video_id: str, stage: str, data: Dict[str, Any]) -> None:
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO checkpoints (video_id, stage, data, at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(video_id, stage) DO UPDATE SET"
+                " data = excluded.data, at = excluded.at",
+                (video_id, stage, json.dumps(data), _now_iso()),
+            )
+
+    def get_checkpoints(self, video_id: str) -> Dict[str, Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT stage, data FROM checkpoints WHERE video_id = ?", (video_id,)
+        )
+        return {r["stage"]: json.loads(r["data"] or "{}") for r in rows}
+
+    def clear_checkpoints(self, video_id: str) -> None:
+        with self._tx() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE video_id = ?", (video_id,))
+
+    def resumable_ids(self) -> List[str]:
+        # Started but never rendered, oldest first. A rendered job clears its
+        # checkpoints, and a source's earlier shorts don't make a new one done.
+        rows = self._conn().execute(
+            "SELECT video_id FROM checkpoints GROUP BY video_id ORDER BY MIN(at)"
+        )
+        return [r["video_id"] for r in rows]
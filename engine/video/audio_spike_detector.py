@@ -1,15 +1,135 @@
+import os
 import subprocess
-import librosa
 import numpy as np
 from pathlib import Path
 
+from engine.utils import metrics
+from engine.utils.artifacts import scratch_path
+
+# "stream": mono PCM at STREAM_SR straight from an ffmpeg pipe, RMS computed
+# chunk by chunk, nothing on disk. "wav": the old extract-then-librosa path.
+AUDIO_MODE = os.getenv("AUDIO_MODE", "stream").strip().lower()
+STREAM_SR = 11025
+# librosa's rms defaults (2048 / 512 at 44.1 kHz) scaled to STREAM_SR, so
+# envelope frames still land every ~11.6 ms
+FRAME_LENGTH = 512
+HOP_LENGTH = 128
+READ_SAMPLES = 1 << 16
+SPIKE_PERCENTILE = 90
+
+
+class RmsEnvelope:
+    # Incremental librosa.feature.rms(center=True, pad_mode="constant"):
+    # feed() samples as they arrive, finish() once at the end. Keeps only
+    # the tail that the next frame still overlaps.
+
+    def __init__(self, frame_length: int = FRAME_LENGTH, hop_length: int = HOP_LENGTH):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self._buf = np.zeros(frame_length // 2, dtype=np.float64)
+
+    def _frames(self) -> np.ndarray:
+        n = 1 + (len(self._buf) - self.frame_length) // self.hop_length
+        if n <= 0:
+            return np.empty(0, dtype=np.float32)
+        # Sum of squares per window via one cumulative sum
+        sq = np.concatenate([[0.0], np.cumsum(self._buf * self._buf)])
+        starts = np.arange(n) * self.hop_length
+        power = (sq[starts + self.frame_length] - sq[starts]) / self.frame_length
+        self._buf = self._buf[n * self.hop_length :]
+        return np.sqrt(np.maximum(power, 0.0)).astype(np.float32)
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        self._buf = np.concatenate([self._buf, samples.astype(np.float64)])
+        return self._frames()
+
+    def finish(self) -> np.ndarray:
+        self._buf = np.concatenate(
+            [self._buf, np.zeros(self.frame_length // 2, dtype=np.float64)]
+        )
+        return self._frames()
+
+
+class LogHistogram:
+    # Fixed-size histogram over log10(value) for percentiles of a stream of
+    # any length. Relative error is one bin width (~0.5% with the defaults).
+
+    def __init__(self, lo: float = 1e-7, hi: float = 10.0, bins: int = 4096):
+        self.lo, self.hi, self.bins = np.log10(lo), np.log10(hi), bins
+        self.counts = np.zeros(bins + 1, dtype=np.int64)  # [0] holds zeros/underflow
+        self.total = 0
+
+    def add(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        with np.errstate(divide="ignore"):
+            logs = np.log10(values)
+        idx = np.floor((logs - self.lo) / (self.hi - self.lo) * self.bins) + 1
+        idx = np.clip(np.nan_to_num(idx, neginf=0), 0, self.bins).astype(np.int64)
+        self.counts += np.bincount(idx, minlength=self.bins + 1)
+        self.total += len(values)
+
+    def percentile(self, q: float) -> float:
+        if not self.total:
+            return 0.0
+        rank = q / 100 * (self.total - 1)
+        i = int(np.searchsorted(np.cumsum(self.counts), rank, side="right"))
+        if i == 0:
+            return 0.0
+        # Upper edge of the bin the rank falls in
+        return float(10 ** (self.lo + (self.hi - self.lo) * i / self.bins))
+
+
+def stream_pcm(video_path: str | Path, sr: int = STREAM_SR, chunk: int = READ_SAMPLES):
+    # Mono float32 PCM from ffmpeg in `chunk`-sample blocks
+    proc = subprocess.Popen(
+        [
+            "ffmpeg",
+            "-v", "error",
+            "-i", str(video_path),
+            "-vn",
+            "-ac", "1",
+            "-ar", str(sr),
+            "-f", "f32le",
+            "pipe:1",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    assert proc.stdout is not None
+    try:
+        while True:
+            buf = proc.stdout.read(chunk * 4)
+            if not buf:
+                break
+            metrics.add(nbytes=len(buf))
+            yield np.frombuffer(buf[: len(buf) // 4 * 4], dtype=np.float32)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+
+
+def spikes_from_envelope(
+    envelope: np.ndarray,
+    percentile: float = SPIKE_PERCENTILE,
+    sr: int = STREAM_SR,
+    hop_length: int = HOP_LENGTH,
+):
+    # Times of envelope frames above the percentile
+    hist = LogHistogram()
+    for i in range(0, len(envelope), READ_SAMPLES):
+        hist.add(envelope[i : i + READ_SAMPLES])
+    threshold = hist.percentile(percentile)
+    spikes = np.where(envelope > threshold)[0]
+    return spikes * hop_length / sr
+
 
 def extract_audio(video_path: str | Path) -> Path:
+    # Short-lived: written to scratch and deleted once spikes are computed
     video_path = Path(video_path)
-    audio_path = video_path.with_suffix(".wav")
-
-    if audio_path.exists():
-        return audio_path
+    audio_path = scratch_path("audio", video_path.stem + ".wav")
 
     cmd = [
         "ffmpeg",
@@ -26,17 +146,45 @@ def extract_audio(video_path: str | Path) -> Path:
     return audio_path
 
 
-def get_audio_spikes(video_path: str | Path):
+def _spikes_from_wav(video_path: str | Path):
+    import librosa  # only the legacy path needs it
+
     print("🎧 Extracting audio...")
     audio_path = extract_audio(video_path)
+    metrics.add(nbytes=metrics.file_size(audio_path))
 
     print("⚡ Detecting audio spikes...")
-    y, sr = librosa.load(str(audio_path), sr=None)
+    try:
+        y, sr = librosa.load(str(audio_path), sr=None)
+    finally:
+        audio_path.unlink(missing_ok=True)
     print(f"🎼 Audio loaded, {len(y)/sr:.1f}s duration")
     energy = librosa.feature.rms(y=y)[0]
 
-    threshold = np.percentile(energy, 90)
+    threshold = np.percentile(energy, SPIKE_PERCENTILE)
     spikes = np.where(energy > threshold)[0]
     times = librosa.frames_to_time(spikes, sr=sr)
 
     return times
+
+
+def _spikes_streaming(video_path: str | Path):
+    print("🎧 Streaming audio energy...")
+    rms = RmsEnvelope()
+    # The envelope is all that's kept: ~86 float32 per second of audio
+    parts = []
+    samples = 0
+    for pcm in stream_pcm(video_path):
+        samples += len(pcm)
+        parts.append(rms.feed(pcm))
+    parts.append(rms.finish())
+
+    print(f"🎼 Audio streamed, {samples / STREAM_SR:.1f}s duration")
+    print("⚡ Detecting audio spikes...")
+    return spikes_from_envelope(np.concatenate(parts))
+
+
+def get_audio_spikes(video_path: str | Path):
+    if AUDIO_MODE == "wav":
+        return _spikes_from_wav(video_path)
+    return _spikes_streaming(video_path)
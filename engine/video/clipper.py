@@ -1,13 +1,18 @@
 import subprocess
-from pathlib import Path
 
-
-CLIP_DIR = Path("data/clips")
-CLIP_DIR.mkdir(parents=True, exist_ok=True)
+from engine.utils.artifacts import scratch_path
+from .decode import OPENCV_VCODECS, probe
 
 
 def extract_clip(video_path, start, end, video_id):
-    out = CLIP_DIR / f"{video_id}_clip.mp4"
+    # Lands in scratch; the pipeline moves it into the artifact store
+    out = scratch_path("clips", f"{video_id}_clip.mp4")
+
+    # Stream copy unless the renderer (OpenCV) couldn't read the codec; then
+    # only these few seconds get re-encoded, never the whole source
+    codec = ["-c", "copy"]
+    if probe(video_path).vcodec not in OPENCV_VCODECS:
+        codec = ["-c:v", "libx264", "-preset", "fast", "-c:a", "aac"]
 
     cmd = [
         "ffmpeg",
@@ -15,10 +20,10 @@ def extract_clip(video_path, start, end, video_id):
         "-ss", str(start),
         "-to", str(end),
         "-i", str(video_path),
-        "-c", "copy",
+        *codec,
         str(out)
     ]
-    
+
     print(f"✂️ Cutting clip from {start:.1f}s to {end:.1f}s")
     subprocess.run(cmd, check=True)
     return out
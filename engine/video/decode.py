@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import json
+import subprocess
+from dataclasses import dataclass
+from fractions import Fraction
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Video codecs the OpenCV wheels' bundled FFmpeg decodes reliably. Clips
+# (not full sources) in anything else get re-encoded before rendering.
+OPENCV_VCODECS = {"h264", "hevc", "mpeg4", "vp8", "vp9"}
+
+
+@dataclass
+class MediaInfo:
+    path: Path
+    format_name: str  # ffprobe's, e.g. "mov,mp4,m4a,3gp,3g2,mj2" or "matroska,webm"
+    duration: float
+    vcodec: Optional[str]
+    acodec: Optional[str]
+    width: int
+    height: int
+    fps: float
+    nb_frames: int  # 0 when the container doesn't say
+    start_time: float = 0.0  # first timestamp; -ss positions are relative to it
+
+    @property
+    def is_mp4(self) -> bool:
+        return "mp4" in self.format_name.split(",") or "mov" in self.format_name
+
+
+def _rate(value: Optional[str]) -> float:
+    try:
+        r = Fraction(value or "0")
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+    return float(r) if r > 0 else 0.0
+
+
+def probe(path: str | Path) -> MediaInfo:
+    out = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            str(path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    data = json.loads(out or "{}")
+    fmt = data.get("format") or {}
+    streams = data.get("streams") or []
+
+    # Ignore cover art / thumbnails muxed in as a "video" stream
+    video = next(
+        (
+            s
+            for s in streams
+            if s.get("codec_type") == "video"
+            and not (s.get("disposition") or {}).get("attached_pic")
+        ),
+        {},
+    )
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+
+    duration = float(fmt.get("duration") or video.get("duration") or 0.0)
+    fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate"))
+    return MediaInfo(
+        path=Path(path),
+        format_name=str(fmt.get("format_name") or ""),
+        duration=duration,
+        vcodec=video.get("codec_name"),
+        acodec=audio.get("codec_name"),
+        width=int(video.get("width") or 0),
+        height=int(video.get("height") or 0),
+        fps=fps,
+        nb_frames=int(video.get("nb_frames") or 0),
+        start_time=float(fmt.get("start_time") or 0.0),
+    )
+
+
+def keyframe_times(path: str | Path) -> List[float]:
+    # Video keyframe timestamps (absolute, like ffprobe's pts_time). Reads
+    # packet headers only, nothing is decoded.
+    out = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=pts_time,flags",
+            "-of",
+            "csv=p=0",
+            str(path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    times = []
+    for line in out.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            times.append(float(pts))
+    return sorted(times)
+
+
+def scaled_size(
+    info: MediaInfo, width: Optional[int] = None, height: Optional[int] = None
+) -> Tuple[int, int]:
+    # Keep aspect ratio when only one side is given; even sizes for yuv
+    w, h = info.width, info.height
+    if width and height:
+        return width, height
+    if width:
+        return width, max(2, int(round(h * width / w / 2)) * 2)
+    if height:
+        return max(2, int(round(w * height / h / 2)) * 2), height
+    return w, h
+
+
+def _decode_cmd(
+    path: str | Path, vf: str, pix_fmt: str, seek: float = 0.0, frames: int = 0
+) -> List[str]:
+    # Input seeking is frame-accurate: ffmpeg decodes from the keyframe
+    # before `seek` and drops everything earlier
+    pre = ["-ss", f"{seek:.6f}"] if seek > 0 else []
+    post = ["-frames:v", str(frames)] if frames > 0 else []
+    return [
+        "ffmpeg",
+        "-v",
+        "error",
+        *pre,
+        "-i",
+        str(path),
+        "-map",
+        "0:v:0",
+        "-vf",
+        vf,
+        *post,
+        "-vsync",
+        "0",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        pix_fmt,
+        "pipe:1",
+    ]
+
+
+def read_frames(
+    path: str | Path,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    gray: bool = False,
+    info: Optional[MediaInfo] = None,
+) -> Iterator[np.ndarray]:
+    # Decode with ffmpeg and scale on the way out, instead of transcoding a
+    # resized copy to disk first. Yields HxW (gray) or HxWx3 (BGR) uint8.
+    info = info or probe(path)
+    if not info.vcodec:
+        raise ValueError(f"No video stream in {path}")
+    w, h = scaled_size(info, width, height)
+    channels = 1 if gray else 3
+    frame_bytes = w * h * channels
+
+    proc = subprocess.Popen(
+        _decode_cmd(path, f"scale={w}:{h}", "gray" if gray else "bgr24"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        bufsize=frame_bytes * 4,
+    )
+    assert proc.stdout is not None
+    shape = (h, w) if gray else (h, w, 3)
+    try:
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(shape)
+    finally:
+        _stop(proc)
+
+
+def read_gray_chunks(
+    path: str | Path,
+    width: int,
+    chunk: int = 256,
+    step: int = 1,
+    info: Optional[MediaInfo] = None,
+    seek: float = 0.0,
+    first_frame: int = 0,
+    max_frames: int = 0,
+) -> Iterator[np.ndarray]:
+    # Small grayscale frames in (n, H, W) blocks, read straight into one
+    # reused buffer. Consume (or copy) each block before asking for the next.
+    #
+    # For a segment: `seek` to it, `first_frame` is the source frame number
+    # found there (keeps every step-th frame on the whole-file grid) and
+    # `max_frames` caps the frames returned.
+    info = info or probe(path)
+    if not info.vcodec:
+        raise ValueError(f"No video stream in {path}")
+    w, h = scaled_size(info, width)
+    frame_bytes = w * h
+
+    # Area averaging: each small pixel is the mean of the block it covers
+    vf = f"scale={w}:{h}:flags=area"
+    if step > 1:
+        # Dropped before scaling, so skipped frames cost only the decode
+        vf = f"select='not(mod(n+{first_frame},{step}))',{vf}"
+    proc = subprocess.Popen(
+        _decode_cmd(path, vf, "gray", seek=seek, frames=max_frames),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        bufsize=frame_bytes * chunk,
+    )
+    assert proc.stdout is not None
+    buf = np.empty((chunk, h, w), dtype=np.uint8)
+    view = memoryview(buf).cast("B")
+    try:
+        while True:
+            got = 0
+            while got < len(view):
+                n = proc.stdout.readinto(view[got:])
+                if not n:
+                    break
+                got += n
+            frames = got // frame_bytes
+            if frames:
+                yield buf[:frames]
+            if got < len(view):
+                break
+    finally:
+        _stop(proc)
+
+
+def _stop(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        proc.kill()
+    if proc.stdout is not None:
+        proc.stdout.close()
+    proc.wait()
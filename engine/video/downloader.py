@@ -1,14 +1,23 @@
+import re
 import subprocess
 from pathlib import Path
+from typing import List, Optional
+
+from .decode import OPENCV_VCODECS, MediaInfo, probe
 
 DOWNLOAD_DIR = Path("data/downloads")
 DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Analysis only needs motion and loudness, not pixels: smallest stream that
+# still has video (scene cuts) and audio (spikes)
+PROXY_FORMAT = "wv*[height>=240]+wa/w[height>=240]/wv*+wa/w"
+
+# yt-dlp's per-format intermediates (<stem>.f137.mp4) and in-progress files
+_PARTIAL = re.compile(r"\.(f\d+|temp)\.|\.(part|ytdl|tmp)$")
 
-def download_video(url: str, video_id: str) -> Path:
-    out_template = DOWNLOAD_DIR / f"{video_id}.%(ext)s"
 
-    base_cmd = [
+def _yt_dlp(url: str, out_template: Path, *extra: str) -> List[str]:
+    return [
         "yt-dlp",
         "--no-warnings",
         "--ignore-errors",
@@ -20,46 +29,148 @@ def download_video(url: str, video_id: str) -> Path:
         "youtube:player_client=android",
         "-o",
         str(out_template),
+        *extra,
         url,
     ]
 
-    # Try best quality first
-    try:
-        print(f"⬇️ Downloading video: {video_id}")
-        subprocess.run(base_cmd + ["-f", "bv*+ba/best"], check=True)
-    except subprocess.CalledProcessError:
-        print("⚠️ Best format failed. Trying fallback...")
-        print("🎞 Normalizing video format...")
-        subprocess.run(base_cmd + ["-f", "mp4"], check=True)
-        print("✅ Video ready for AI analysis")
-
 
-    files = list(DOWNLOAD_DIR.glob(f"{video_id}.*"))
+def _downloaded(stem: str) -> Path:
+    files = [
+        f
+        for f in DOWNLOAD_DIR.glob(f"{stem}.*")
+        if not _PARTIAL.search(f.name)
+    ]
     if not files:
         raise FileNotFoundError("Download failed completely.")
+    return files[0]
 
-    raw_video = files[0]
-    fixed_video = DOWNLOAD_DIR / f"{video_id}_fixed.mp4"
 
-    # Convert to stable format for OpenCV
-    subprocess.run(
+def _normalize(raw_video: Path, out: Path, width: Optional[int] = None) -> Path:
+    # Convert to stable format for OpenCV. Only for sources that need it:
+    # analysis decodes through ffmpeg and scales on read (see decode.py).
+    cmd = ["ffmpeg", "-y", "-i", str(raw_video)]
+    if width:
+        cmd += ["-vf", f"scale={width}:-2"]
+    cmd += ["-c:v", "libx264", "-preset", "fast", "-c:a", "aac", str(out)]
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return out
+
+
+def _remux(raw_video: Path, out: Path) -> bool:
+    # Container change only (e.g. webm/mkv -> mp4), no re-encode
+    r = subprocess.run(
         [
             "ffmpeg",
             "-y",
             "-i",
             str(raw_video),
-            "-vf",
-            "scale=1280:-2",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "fast",
-            "-c:a",
-            "aac",
-            str(fixed_video),
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0?",
+            "-c",
+            "copy",
+            "-movflags",
+            "+faststart",
+            str(out),
         ],
         stdout=subprocess.DEVNULL,
         stderr=subprocess.DEVNULL,
     )
-    print("🎞 Video normalized, ready for AI analysis")
+    return r.returncode == 0 and out.exists() and out.stat().st_size > 0
+
+
+def _probe(path: Path) -> Optional[MediaInfo]:
+    try:
+        return probe(path)
+    except (subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def prepare_source(raw_video: Path, out: Path, opencv: bool = False) -> Path:
+    # Probe first and do the cheapest thing that works:
+    #   mp4 with a video stream          -> use as-is
+    #   other container, copyable codecs -> remux to mp4
+    #   anything else (or `opencv` and a codec OpenCV can't read) -> re-encode
+    info = _probe(raw_video)
+    needs_encode = info is None or not info.vcodec or (
+        opencv and info.vcodec not in OPENCV_VCODECS
+    )
+
+    if not needs_encode and info is not None and info.is_mp4:
+        print(f"🎞 {info.vcodec}/{info.acodec} in mp4, using the download as-is")
+        return raw_video
+
+    if not needs_encode and _remux(raw_video, out):
+        print(f"🎞 Remuxed {raw_video.suffix} -> mp4 (no re-encode)")
+    else:
+        print("🎞 Normalizing video format...")
+        _normalize(raw_video, out)
+    if raw_video != out and raw_video.exists():
+        raw_video.unlink()
+    return out
+
+
+def download_video(url: str, video_id: str) -> Path:
+    out_template = DOWNLOAD_DIR / f"{video_id}.%(ext)s"
+    base_cmd = _yt_dlp(url, out_template)
+
+    # Try best quality first
+    try:
+        print(f"⬇️ Downloading video: {video_id}")
+        subprocess.run(base_cmd + ["-f", "bv*+ba/best"], check=True)
+    except subprocess.CalledProcessError:
+        print("⚠️ Best format failed. Trying fallback...")
+        print("🎞 Normalizing video format...")
+        subprocess.run(base_cmd + ["-f", "mp4"], check=True)
+        print("✅ Video ready for AI analysis")
+
+    raw_video = _downloaded(video_id)
+    fixed_video = prepare_source(raw_video, DOWNLOAD_DIR / f"{video_id}_fixed.mp4")
+    print("🎞 Video ready for AI analysis")
     return fixed_video
+
+
+def download_proxy(url: str, video_id: str) -> Path:
+    # Phase 1 of proxy mode: a low-bitrate copy that's only used to pick
+    # the moment. Timestamps carry over to the full-quality source.
+    stem = f"{video_id}_proxy"
+    print(f"⬇️ Downloading analysis proxy: {video_id}")
+    subprocess.run(
+        _yt_dlp(url, DOWNLOAD_DIR / f"{stem}.%(ext)s", "-f", PROXY_FORMAT),
+        check=True,
+    )
+
+    raw_video = _downloaded(stem)
+    return prepare_source(raw_video, DOWNLOAD_DIR / f"{video_id}_proxy_fixed.mp4")
+
+
+def download_section(url: str, video_id: str, start: float, end: float) -> Path:
+    # Phase 2: only [start, end] at full quality. Cutting at exact
+    # timestamps (not the previous keyframe) makes the section the clip.
+    # One file per range: a later moment of the same source is a new section
+    stem = f"{video_id}_section_{int(start * 1000)}-{int(end * 1000)}"
+    fixed = DOWNLOAD_DIR / f"{stem}_fixed.mp4"
+    # Leftovers of an interrupted attempt would be picked up as the result
+    for f in [*DOWNLOAD_DIR.glob(f"{stem}.*"), fixed]:
+        f.unlink(missing_ok=True)
+
+    print(f"⬇️ Downloading {start:.1f}-{end:.1f}s at full quality: {video_id}")
+    base_cmd = _yt_dlp(
+        url,
+        DOWNLOAD_DIR / f"{stem}.%(ext)s",
+        "--download-sections",
+        f"*{start:.3f}-{end:.3f}",
+        "--force-keyframes-at-cuts",
+        "--force-overwrites",
+        "--merge-output-format",
+        "mp4",
+    )
+    try:
+        subprocess.run(base_cmd + ["-f", "bv*+ba/best"], check=True)
+    except subprocess.CalledProcessError:
+        print("⚠️ Best format failed. Trying fallback...")
+        subprocess.run(base_cmd + ["-f", "mp4"], check=True)
+
+    # This is the clip: the renderer reads it with OpenCV
+    return prepare_source(_downloaded(stem), fixed, opencv=True)
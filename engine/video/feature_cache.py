@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from engine.utils.artifacts import scratch_path, store
+from .audio_spike_detector import FRAME_LENGTH, HOP_LENGTH, STREAM_SR
+from .scene_change_detector import FAST_STEP, FAST_WIDTH
+
+# Analysis features per source, kept so moment selection (new percentile,
+# threshold, clip length, a second clip) never has to decode again:
+#
+#   data/artifacts/features/<source_id>-<key>.{rms,frame_diff}.npy
+#   data/artifacts/features/<source_id>-<key>.json   (fps, duration, ...)
+#
+# Only raw series are stored; spikes and cuts depend on the caller's
+# percentile and threshold and are derived on every load. The key covers
+# the decode parameters and FEATURES_VERSION; bump it when an analyzer's
+# output changes. Files are evicted with the media cache.
+FEATURES_VERSION = 1
+STAGE = "features"
+ARRAYS = ("rms", "frame_diff")
+META = ("fps", "duration", "step", "sr", "hop_length")
+
+
+def feature_params(video_path: str | Path) -> Dict[str, Any]:
+    # Size tells a proxy from a full download of the same video id
+    return {
+        "width": FAST_WIDTH,
+        "step": FAST_STEP,
+        "sr": STREAM_SR,
+        "frame_length": FRAME_LENGTH,
+        "hop_length": HOP_LENGTH,
+        "size": Path(video_path).stat().st_size,
+    }
+
+
+def load_features(source_id: str, video_path: str | Path) -> Optional[Dict[str, Any]]:
+    # Arrays come back memory-mapped: nothing is read until it's used
+    params = feature_params(video_path)
+    meta = store.get_json(STAGE, source_id, params, FEATURES_VERSION)
+    if meta is None:
+        return None
+
+    feats: Dict[str, Any] = dict(meta)
+    for name in ARRAYS:
+        p = store.get(STAGE, source_id, params, FEATURES_VERSION, f".{name}.npy")
+        if p is None:
+            return None
+        feats[name] = np.load(p, mmap_mode="r")
+    return feats
+
+
+def save_features(
+    source_id: str, video_path: str | Path, feats: Dict[str, Any]
+) -> None:
+    params = feature_params(video_path)
+    for name in ARRAYS:
+        tmp = scratch_path("features", f"{source_id}.{name}.npy")
+        np.save(tmp, np.asarray(feats[name]))
+        store.put(tmp, STAGE, source_id, params, FEATURES_VERSION, f".{name}.npy")
+    # Written last: its presence is what marks the set complete
+    store.put_json(
+        {k: feats[k] for k in META}, STAGE, source_id, params, FEATURES_VERSION
+    )
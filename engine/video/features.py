@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from engine.utils import metrics
+from .audio_spike_detector import HOP_LENGTH, READ_SAMPLES, STREAM_SR, RmsEnvelope
+from .decode import MediaInfo, probe, scaled_size
+from .scene_change_detector import CHUNK_FRAMES, FAST_STEP, FAST_WIDTH
+
+# Per-source analysis in one ffmpeg pass: the source is demuxed and decoded
+# once, small gray frames go out on stdout and mono PCM on a second pipe,
+# and each stream is read on its own thread by whichever consumers are
+# registered for it.
+#
+#   ex = FeatureExtractor()                # rms + frame_diff by default
+#   ex.add("motion", MyAnalyzer())         # anything with kind/feed/finish
+#   feats = ex.run(path)                   # {"rms": ..., "frame_diff": ..., "motion": ...}
+
+
+class AudioRms:
+    # RMS envelope, one value every HOP_LENGTH samples at STREAM_SR
+    kind = "audio"
+
+    def __init__(self) -> None:
+        self._rms = RmsEnvelope()
+        self._parts: List[np.ndarray] = []
+
+    def feed(self, pcm: np.ndarray) -> None:
+        self._parts.append(self._rms.feed(pcm))
+
+    def finish(self) -> np.ndarray:
+        self._parts.append(self._rms.finish())
+        return np.concatenate(self._parts)
+
+
+class FrameDiffSeries:
+    # Mean absolute difference of each kept frame against the one before
+    # (0 for the first), the series the fast scene scan thresholds
+    kind = "video"
+
+    def __init__(self) -> None:
+        self._prev: Optional[np.ndarray] = None
+        self._parts: List[np.ndarray] = []
+
+    def feed(self, frames: np.ndarray) -> None:
+        cur = frames.astype(np.int16)
+        if self._prev is None:
+            self._parts.append(np.zeros(1, dtype=np.float32))
+            lead = cur
+        else:
+            lead = np.concatenate([self._prev[None], cur])
+        scores = np.abs(np.diff(lead, axis=0)).mean(axis=(1, 2))
+        self._parts.append(scores.astype(np.float32))
+        self._prev = cur[-1]
+
+    def finish(self) -> np.ndarray:
+        if not self._parts:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self._parts)
+
+
+class FeatureExtractor:
+    def __init__(
+        self,
+        width: int = FAST_WIDTH,
+        step: int = FAST_STEP,
+        sr: int = STREAM_SR,
+        defaults: bool = True,
+    ) -> None:
+        self.width = width
+        self.step = step
+        self.sr = sr
+        self.consumers: Dict[str, Any] = {}
+        if defaults:
+            self.add("rms", AudioRms())
+            self.add("frame_diff", FrameDiffSeries())
+
+    def add(self, name: str, consumer: Any) -> None:
+        if consumer.kind not in ("audio", "video"):
+            raise ValueError(f"Unknown consumer kind: {consumer.kind}")
+        self.consumers[name] = consumer
+
+    def _of(self, kind: str) -> List[Any]:
+        return [c for c in self.consumers.values() if c.kind == kind]
+
+    def _command(
+        self, path: Path, info: MediaInfo, audio_fd: Optional[int]
+    ) -> Tuple[List[str], Tuple[int, int]]:
+        w, h = scaled_size(info, self.width)
+        cmd = ["ffmpeg", "-v", "error", "-i", str(path)]
+        if info.vcodec and self._of("video"):
+            vf = f"scale={w}:{h}:flags=area"
+            if self.step > 1:
+                vf = f"select='not(mod(n,{self.step}))',{vf}"
+            cmd += [
+                "-map", "0:v:0",
+                "-vf", vf,
+                "-vsync", "0",
+                "-f", "rawvideo",
+                "-pix_fmt", "gray",
+                "pipe:1",
+            ]
+        if audio_fd is not None:
+            cmd += [
+                "-map", "0:a:0",
+                "-ac", "1",
+                "-ar", str(self.sr),
+                "-f", "f32le",
+                f"pipe:{audio_fd}",
+            ]
+        return cmd, (w, h)
+
+    def run(self, path: str | Path, info: Optional[MediaInfo] = None) -> Dict[str, Any]:
+        path = Path(path)
+        info = info or probe(path)
+        want_video = bool(info.vcodec and self._of("video"))
+        want_audio = bool(info.acodec and self._of("audio"))
+        if not (want_video or want_audio):
+            return {name: c.finish() for name, c in self.consumers.items()}
+
+        r_fd = w_fd = None
+        if want_audio:
+            r_fd, w_fd = os.pipe()
+        cmd, (w, h) = self._command(path, info, w_fd)
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE if want_video else subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            pass_fds=(w_fd,) if w_fd is not None else (),
+        )
+        if w_fd is not None:
+            # Only ffmpeg holds the write end now, so EOF arrives when it exits
+            os.close(w_fd)
+
+        errors: List[BaseException] = []
+
+        def pump(fn, *args) -> None:
+            try:
+                fn(*args)
+            except BaseException as e:  # re-raised on the calling thread
+                errors.append(e)
+                if proc.poll() is None:
+                    proc.kill()
+
+        threads = []
+        if want_audio:
+            audio = os.fdopen(r_fd, "rb")
+            threads.append(threading.Thread(target=pump, args=(self._read_audio, audio)))
+        if want_video:
+            threads.append(
+                threading.Thread(target=pump, args=(self._read_video, proc.stdout, w, h))
+            )
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            if proc.stdout is not None:
+                proc.stdout.close()
+            if want_audio:
+                audio.close()
+            proc.wait()
+        if errors:
+            raise errors[0]
+
+        return {name: c.finish() for name, c in self.consumers.items()}
+
+    def _read_audio(self, stream) -> None:
+        consumers = self._of("audio")
+        nbytes = READ_SAMPLES * 4
+        while True:
+            buf = stream.read(nbytes)
+            if not buf:
+                break
+            pcm = np.frombuffer(buf[: len(buf) // 4 * 4], dtype=np.float32)
+            for c in consumers:
+                c.feed(pcm)
+
+    def _read_video(self, stream, w: int, h: int) -> None:
+        consumers = self._of("video")
+        frame_bytes = w * h
+        buf = np.empty((CHUNK_FRAMES, h, w), dtype=np.uint8)
+        view = memoryview(buf).cast("B")
+        while True:
+            got = 0
+            while got < len(view):
+                n = stream.readinto(view[got:])
+                if not n:
+                    break
+                got += n
+            frames = got // frame_bytes
+            if frames:
+                for c in consumers:
+                    c.feed(buf[:frames])
+            if got < len(view):
+                break
+
+
+def extract_features(path: str | Path, info: Optional[MediaInfo] = None) -> Dict[str, Any]:
+    # The standard set: rms envelope + frame-diff series, plus what the
+    # caller needs to turn them into times
+    info = info or probe(path)
+    ex = FeatureExtractor()
+    print("🧪 Extracting audio + video features in one pass...")
+    feats = ex.run(path, info)
+    metrics.add(frames=len(feats["frame_diff"]) * ex.step)
+    feats.update(
+        fps=info.fps,
+        duration=info.duration,
+        step=ex.step,
+        sr=ex.sr,
+        hop_length=HOP_LENGTH,
+    )
+    return feats
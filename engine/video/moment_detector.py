@@ -1,33 +1,130 @@
+import os
 import numpy as np
 from pathlib import Path
-from .audio_spike_detector import get_audio_spikes
-from .scene_change_detector import get_scene_changes
+from .audio_spike_detector import get_audio_spikes, spikes_from_envelope
+from .decode import probe
+from .feature_cache import load_features, save_features
+from .features import extract_features
+from .scene_change_detector import (
+    SCENE_MODE,
+    SCENE_WORKERS,
+    cuts_from_diffs,
+    get_scene_changes,
+)
+from engine.utils.metrics import measure
 
+# "joint": one decode feeds both the audio and the video analysis.
+# "separate": audio and scene passes each decode the source on their own
+# (also used whenever SCENE_MODE=full or SCENE_WORKERS>1 asks for a
+# specific scene scan).
+FEATURE_MODE = os.getenv("FEATURE_MODE", "joint").strip().lower()
 
-def find_best_moment(video_path: str | Path, clip_len=45):
-    video_path = str(video_path)
 
+# Candidate window starts: every MOMENT_STEP_S seconds, plus every cut
+MOMENT_STEP_S = 1.0
+
+
+def _analyze_joint(video_path, source_id=None, threshold=30):
+    feats = load_features(source_id, video_path) if source_id else None
+    if feats is not None:
+        print(f"♻️ Using cached features for {source_id}")
+    else:
+        with measure("extract_features"):
+            feats = extract_features(video_path)
+        if source_id:
+            save_features(source_id, video_path, feats)
+
+    audio_times = spikes_from_envelope(
+        feats["rms"], sr=feats["sr"], hop_length=feats["hop_length"]
+    )
+    cut_times = cuts_from_diffs(
+        feats["frame_diff"], feats["fps"], threshold, step=feats["step"]
+    )
+    print(f"🎞 Cuts detected: {len(cut_times)}")
+    return audio_times, cut_times, feats["duration"]
+
+
+def _analyze_separate(video_path, source_id=None, threshold=30):
+    # Each pass keeps only its result, so there's nothing to cache here
+    if source_id:
+        print("ℹ️ Feature cache is joint-mode only; decoding the source again")
     print("🎧 Extracting audio & analyzing spikes...")
-    audio_times = get_audio_spikes(video_path)
-    
+    with measure("get_audio_spikes"):
+        audio_times = get_audio_spikes(video_path)
+
     print("🎬 Detecting scene changes...")
-    scenes = get_scene_changes(video_path)
+    with measure("get_scene_changes"):
+        scenes = get_scene_changes(video_path, threshold=threshold)
+
+    duration = probe(video_path).duration
+    # The no-cuts fallback is a single scene ending at the duration
+    cut_times = [end for _, end in scenes if end < duration]
+    return audio_times, cut_times, duration
 
-    print("🧠 Scoring scenes...")
 
-    scores = []
-    
+def score_windows(audio_times, cut_times, duration, clip_len, step=MOMENT_STEP_S):
+    # Every candidate [start, start + clip_len] at once: spike and cut counts
+    # are differences of two binary searches over the sorted timelines
+    spikes = np.sort(np.asarray(audio_times, dtype=float))
+    cuts = np.sort(np.asarray(cut_times, dtype=float))
+    last = max(duration - clip_len, 0.0)
+
+    starts = np.unique(
+        np.concatenate([np.arange(0.0, last + 1e-9, step), cuts[cuts <= last]])
+    )
+    ends = starts + clip_len
+    n_spikes = np.searchsorted(spikes, ends, "right") - np.searchsorted(
+        spikes, starts, "left"
+    )
+    # Cuts strictly inside; a window may start or end on one
+    n_cuts = np.searchsorted(cuts, ends, "left") - np.searchsorted(
+        cuts, starts, "right"
+    )
+    return starts, n_spikes, n_cuts
+
+
+def top_windows(starts, n_spikes, n_cuts, clip_len, k):
+    # Best first: windows inside one scene before any that cross a cut,
+    # then most spikes, then earliest. Greedily keep the ones that don't
+    # overlap anything already picked.
+    order = np.lexsort((starts, -n_spikes, n_cuts))
+    picked = []
+    for i in order:
+        s = float(starts[i])
+        if all(abs(s - p) >= clip_len for p in picked):
+            picked.append(s)
+            if len(picked) == k:
+                break
+    return [(s, s + clip_len) for s in picked]
+
+
+def find_best_moments(
+    video_path: str | Path, k=3, clip_len=45, source_id=None, threshold=30
+):
+    # Top k non-overlapping clips from one analysis of the source. With a
+    # source_id, joint-mode features are cached and reused across calls.
+    # `threshold` is the scene-cut threshold, as in get_scene_changes.
+    video_path = str(video_path)
+
+    joint = FEATURE_MODE == "joint" and SCENE_MODE != "full" and SCENE_WORKERS <= 1
+    analyze = _analyze_joint if joint else _analyze_separate
+    audio_times, cut_times, duration = analyze(video_path, source_id, threshold)
 
-    for start, end in scenes:
-        duration = end - start
-        if duration < clip_len:
-            continue
+    print("🧠 Scoring moments...")
+    if not duration:
+        duration = max(list(cut_times) + [clip_len])
 
-        spike_count = np.sum((audio_times >= start) & (audio_times <= end))
-        scores.append((spike_count, start))
+    starts, n_spikes, n_cuts = score_windows(
+        audio_times, cut_times, duration, clip_len
+    )
+    moments = top_windows(starts, n_spikes, n_cuts, clip_len, k)
+    return moments or [(0, clip_len)]
 
-    if not scores:
-        return 0, clip_len
 
-    best_start = max(scores)[1]
-    return best_start, best_start + clip_len
+def find_best_moment(
+    video_path: str | Path, clip_len=45, source_id=None, threshold=30
+):
+    moments = find_best_moments(
+        video_path, k=1, clip_len=clip_len, source_id=source_id, threshold=threshold
+    )
+    return moments[0]
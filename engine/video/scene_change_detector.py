@@ -1,48 +1,237 @@
+import multiprocessing
+import os
 import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from engine.utils import metrics
+from .decode import keyframe_times, probe, read_frames, read_gray_chunks
 
-def get_scene_changes(video_path: str | Path, threshold=30):
-    print("🎬 Starting scene detection...")
+# Same width the old normalized copy had, so thresholds keep their meaning
+ANALYSIS_WIDTH = 1280
+
+# "fast": 160px-wide gray frames diffed a chunk at a time in NumPy.
+# "full": the original per-frame scan at ANALYSIS_WIDTH.
+SCENE_MODE = os.getenv("SCENE_MODE", "fast").strip().lower()
+FAST_WIDTH = 160  # 160x90 for 16:9 sources
+# Compare every Nth frame only; cut times are then accurate to N frames
+FAST_STEP = max(1, int(os.getenv("SCENE_STEP", "1")))
+CHUNK_FRAMES = 512
+# Processes for the fast scan; >1 splits the source into keyframe-aligned
+# segments. Sources shorter than two MIN_SEGMENT_S segments stay serial.
+SCENE_WORKERS = int(os.getenv("SCENE_WORKERS", "1"))
+MIN_SEGMENT_S = 60
+# Mean gray-level difference under which two decodes count as the same frame
+SEAM_TOLERANCE = 2.0
 
-    cap = cv2.VideoCapture(str(video_path))
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
 
+def _cuts_to_scenes(cut_times, duration):
     scenes = []
-    prev_gray = None
-    frame_num = 0
     last_cut_time = 0
+    for t in cut_times:
+        scenes.append((last_cut_time, t))
+        last_cut_time = t
+
+    if not scenes:
+        print("⚠️ No cuts detected. Using full video.")
+        return [(0, duration)]
+
+    print(f"🎞 Scenes detected: {len(scenes)}")
+    return scenes
+
+
+def cuts_from_diffs(diffs, fps, threshold=30, step=1):
+    # Cut times from a per-frame difference series (diffs[k] = kept frame k
+    # against the one before, diffs[0] = 0), as built by
+    # features.FrameDiffSeries
+    above = np.flatnonzero(np.asarray(diffs) > threshold)
+    return np.array([_frame_time(int(k) * step, fps) for k in above], dtype=float)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
 
+def _scan_full(video_path, info, threshold):
+    fps = info.fps
+    total_frames = info.nb_frames or int(info.duration * fps)
+    width = min(info.width, ANALYSIS_WIDTH)
+
+    cuts = []
+    prev_gray = None
+    frame_num = 0
+
+    for gray in read_frames(video_path, width=width, gray=True, info=info):
         frame_num += 1
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
         if prev_gray is not None:
             diff = cv2.absdiff(gray, prev_gray)
             score = diff.mean()
 
             if score > threshold:
-                t = frame_num / fps
-                scenes.append((last_cut_time, t))
-                last_cut_time = t
+                cuts.append(frame_num / fps)
 
         prev_gray = gray
 
         # Progress display
-        if frame_num % 300 == 0:
+        if frame_num % 300 == 0 and total_frames:
             pct = (frame_num / total_frames) * 100
             print(f"📊 Scene scan progress: {pct:.1f}%")
 
-    cap.release()
+    return cuts, frame_num
 
-    if not scenes:
-        print("⚠️ No cuts detected. Using full video.")
-        return [(0, total_frames / fps)]
 
-    print(f"🎞 Scenes detected: {len(scenes)}")
-    return scenes
+def _diff_chunks(chunks, threshold, step=1, first_frame=0, total_frames=0):
+    # Chunked diff of consecutive (kept) frames. Returns the source frame
+    # numbers right after each cut, the first and last frame seen, and how
+    # many frames were read.
+    start = -(-first_frame // step) * step  # first kept frame number
+    cuts = []
+    first = prev = None  # int16
+    n = 0
+
+    for chunk in chunks:
+        frames = chunk.astype(np.int16)
+        if first is None:
+            first = frames[0]
+        base = n
+        if prev is not None:
+            frames = np.concatenate([prev[None], frames])
+            base -= 1
+        # Mean absolute difference of each frame against the one before it
+        scores = np.abs(np.diff(frames, axis=0)).mean(axis=(1, 2))
+        for i in np.flatnonzero(scores > threshold):
+            cuts.append(start + (base + i + 1) * step)
+
+        prev = frames[-1]
+        n += len(chunk)
+        if total_frames:
+            pct = min(100.0, (start + n * step) / total_frames * 100)
+            print(f"📊 Scene scan progress: {pct:.1f}%")
+
+    return cuts, first, prev, n
+
+
+def _frame_time(frame, fps):
+    # Same convention as the full scan: a cut is at the 1-based number of
+    # the first frame after it
+    return (frame + 1) / fps
+
+
+def _scan_fast(video_path, info, threshold, step=FAST_STEP):
+    total_frames = info.nb_frames or int(info.duration * info.fps)
+    chunks = read_gray_chunks(
+        video_path, width=FAST_WIDTH, chunk=CHUNK_FRAMES, step=step, info=info
+    )
+    cuts, _, _, n = _diff_chunks(chunks, threshold, step, total_frames=total_frames)
+    # Skipped frames were still decoded
+    return [_frame_time(f, info.fps) for f in cuts], n * step
+
+
+# ----------------------------
+# SEGMENT-PARALLEL SCAN
+# ----------------------------
+def _kept(a, b, step):
+    # Frames on the step grid in [a, b)
+    return -(-b // step) - -(-a // step)
+
+
+def _plan_segments(video_path, info, parts):
+    # Split at keyframes near equal shares of the file: seeking to a keyframe
+    # costs no extra decode. Returns [(first_frame, end_frame or None)].
+    fps = info.fps
+    total = info.nb_frames or int(info.duration * fps)
+    key_frames = sorted(
+        {round((t - info.start_time) * fps) for t in keyframe_times(video_path)}
+    )
+    key_frames = [f for f in key_frames if 0 < f < total]
+    if not key_frames:
+        return [(0, None)]
+
+    bounds = []
+    for i in range(1, parts):
+        target = total * i / parts
+        best = min(key_frames, key=lambda f: abs(f - target))
+        if best not in bounds:
+            bounds.append(best)
+    bounds.sort()
+    return list(zip([0] + bounds, bounds + [None]))
+
+
+def _scan_segment(video_path, info, first_frame, end_frame, threshold, step):
+    # Worker: one keyframe-aligned segment of the source, plus the next
+    # segment's first kept frame. Diffing into it catches a cut right at the
+    # seam, and it has to match what the next worker found after its seek.
+    seek = 0.0
+    if first_frame > 0:
+        # Half a frame early so rounding can't skip the keyframe itself
+        seek = (first_frame - 0.5) / info.fps
+    max_frames = _kept(first_frame, end_frame, step) + 1 if end_frame else 0
+    chunks = read_gray_chunks(
+        video_path,
+        width=FAST_WIDTH,
+        chunk=CHUNK_FRAMES,
+        step=step,
+        info=info,
+        seek=seek,
+        first_frame=first_frame,
+        max_frames=max_frames,
+    )
+    cuts, first, last, n = _diff_chunks(chunks, threshold, step, first_frame)
+    if first is not None:
+        first, last = first.astype(np.uint8), last.astype(np.uint8)
+    return cuts, first, last, n
+
+
+def _scan_parallel(video_path, info, threshold, workers, step=FAST_STEP):
+    segments = _plan_segments(video_path, info, workers)
+    if len(segments) < 2:
+        return _scan_fast(video_path, info, threshold, step)
+    print(f"🧩 Scanning {len(segments)} segments on {workers} processes...")
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [
+            pool.submit(_scan_segment, str(video_path), info, a, b, threshold, step)
+            for a, b in segments
+        ]
+        results = [f.result() for f in futures]
+
+    # Each seek must have landed on the frame the previous segment read last
+    # (its one frame of overlap). Anything else (VFR, a broken index, a
+    # keyframe that isn't where probing said) shifts every cut after it:
+    # redo the whole scan serially. The first segment never seeks, so the
+    # chain starts from a known frame. On a still shot a seek that's a few
+    # frames off can pass, costing at most those frames of cut timing.
+    for (a, b), prev, nxt in zip(segments, results, results[1:]):
+        _, _, prev_last, n = prev
+        _, next_first, _, _ = nxt
+        if (
+            n != _kept(a, b, step) + 1
+            or next_first is None
+            or np.abs(next_first.astype(np.int16) - prev_last).mean() > SEAM_TOLERANCE
+        ):
+            print("⚠️ Segment boundaries didn't line up, rescanning serially.")
+            return _scan_fast(video_path, info, threshold, step)
+
+    # A seam cut is already in the earlier segment's list; the later one
+    # can't report a cut on its own first frame
+    cuts = [f for seg_cuts, _, _, _ in results for f in seg_cuts]
+    frames = sum(n for _, _, _, n in results) - (len(results) - 1)
+    return [_frame_time(f, info.fps) for f in cuts], frames * step
+
+
+def get_scene_changes(video_path: str | Path, threshold=30, mode=None, workers=None):
+    print("🎬 Starting scene detection...")
+
+    # ffmpeg decodes straight to grayscale at analysis size; no
+    # normalized copy of the source has to exist on disk
+    info = probe(video_path)
+    mode = mode or SCENE_MODE
+    workers = min(workers or SCENE_WORKERS, int(info.duration // MIN_SEGMENT_S))
+    if mode == "full":
+        cuts, frames = _scan_full(video_path, info, threshold)
+    elif workers > 1:
+        cuts, frames = _scan_parallel(video_path, info, threshold, workers)
+    else:
+        cuts, frames = _scan_fast(video_path, info, threshold)
+
+    metrics.add(frames=frames)
+    return _cuts_to_scenes(cuts, info.duration or frames / info.fps)
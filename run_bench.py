@@ -0,0 +1,76 @@
+import argparse
+import sys
+
+from engine.bench.suite import (
+    BENCHES,
+    SOURCE_BENCHES,
+    load_baseline,
+    report,
+    run_bench,
+    save_baseline,
+)
+from engine.bench.synthetic import HEIGHTS, SourceSpec
+
+
+def _ints(spec: str):
+    return [int(x) for x in spec.split(",") if x.strip()]
+
+
+def main() -> None:
+    # Offline benchmarks on generated sources (needs ffmpeg, no network).
+    # Fails with exit code 1 when a case is slower or bigger than baseline.
+    ap = argparse.ArgumentParser(description="Media pipeline benchmarks")
+    ap.add_argument("--heights", default="720,1080", help="e.g. 720,1080")
+    ap.add_argument("--minutes", default="1,10", help="source lengths, e.g. 1,10")
+    ap.add_argument(
+        "--full", action="store_true", help="long sources too (1,10,60,180 min)"
+    )
+    ap.add_argument("--only", default="", help=f"subset of: {','.join(BENCHES)}")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per case (best wins)")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed regression")
+    ap.add_argument(
+        "--save-baseline", action="store_true", help="store these numbers as baseline"
+    )
+    args = ap.parse_args()
+
+    heights = _ints(args.heights)
+    bad = [h for h in heights if h not in HEIGHTS]
+    if bad:
+        ap.error(f"unsupported height(s): {bad}")
+    minutes = [1, 10, 60, 180] if args.full else _ints(args.minutes)
+    benches = [b for b in args.only.split(",") if b] or list(BENCHES)
+    unknown = [b for b in benches if b not in BENCHES]
+    if unknown:
+        ap.error(f"unknown bench(es): {unknown}")
+
+    results = []
+    for h in heights:
+        for bench in benches:
+            # Clip benches always run on a 45s clip; one case per height
+            lengths = minutes if bench in SOURCE_BENCHES else minutes[:1]
+            for m in lengths:
+                print(f"\n⏱ {bench} @ {h}p / {m} min")
+                results.append(
+                    run_bench(bench, SourceSpec(height=h, seconds=m * 60), args.repeat)
+                )
+
+    print()
+    baseline = load_baseline()
+    failures = report(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        save_baseline(results)
+        print("💾 Baseline updated.")
+        return
+
+    if failures:
+        print("\n❌ Performance regressions:")
+        for f in failures:
+            print("  -", f)
+        sys.exit(1)
+    if not baseline:
+        print("\nℹ️ No baseline yet; run with --save-baseline to record one.")
+
+
+if __name__ == "__main__":
+    main()
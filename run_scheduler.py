@@ -1,18 +1,33 @@
 from config.settings import get_settings
+from engine.discovery.http_cache import ResponseCache
+from engine.discovery.http_client import HttpClient
 from engine.discovery.youtube_fetcher import YouTubeFetcher
 from engine.discovery.twitch_fetcher import TwitchFetcher
 from engine.discovery.discovery import DiscoveryService
+from engine.discovery.snapshots import SnapshotStore
 from engine.scheduler.runner import run_forever
 
 
 def main():
     s = get_settings()
 
-    yt = YouTubeFetcher(api_key=s.youtube_api_key, user_agent=s.user_agent)
+    cache = ResponseCache(ttl_seconds=s.http_cache_ttl_minutes * 60)
+    # One pooled client for both APIs, sized to the discovery pool
+    http = HttpClient(user_agent=s.user_agent, pool_size=s.discovery_workers)
+
+    yt = YouTubeFetcher(
+        api_key=s.youtube_api_key,
+        user_agent=s.user_agent,
+        cache=cache,
+        client=http,
+    )
     tw = TwitchFetcher(
         client_id=s.twitch_client_id,
         client_secret=s.twitch_client_secret,
         user_agent=s.user_agent,
+        user_cache_ttl_hours=s.twitch_user_cache_ttl_hours,
+        cache=cache,
+        client=http,
     )
 
     discovery = DiscoveryService(
@@ -20,6 +35,13 @@ def main():
         tw=tw,
         days_lookback=s.days_lookback,
         max_results_per_creator=s.max_results_per_creator,
+        max_workers=s.discovery_workers,
+        platform_limits={
+            "youtube": s.youtube_concurrency,
+            "twitch": s.twitch_concurrency,
+        },
+        youtube_mode=s.youtube_discovery_mode,
+        snapshots=SnapshotStore(),
     )
 
     run_forever(discovery, "config/creators.json")
@@ -0,0 +1,35 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from engine.scheduler.job_queue import JobQueue, start_workers
+from engine.scheduler.pipeline import STAGES, sweep_media
+
+
+def main() -> None:
+    load_dotenv()
+    # Production worker for the shared job queue (JOB_QUEUE=1 on the scheduler).
+    # Run one per box; WORKER_STAGES lets e.g. render boxes only take renders.
+    stages = [
+        s.strip()
+        for s in os.getenv("WORKER_STAGES", ",".join(STAGES)).split(",")
+        if s.strip()
+    ]
+    count = int(os.getenv("WORKER_THREADS", "1"))
+
+    sweep_media()
+    queue = JobQueue()
+    workers = start_workers(queue, stages, count)
+    print(f"🔧 {len(workers)} worker(s) on {queue.path} | stages: {', '.join(stages)}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for w in workers:
+            w.stop()
+        print("\n🛑 Worker stopped by user.")
+
+
+if __name__ == "__main__":
+    main()